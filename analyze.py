@@ -1,6 +1,21 @@
 import numpy as np
+import librosa
 import essentia
 import essentia.standard as es
+from dataclasses import dataclass
+from audio_io import load_array
+from metrics import inc
+
+# essentia's MonoLoader output; onset envelopes use librosa's default hop
+ANALYSIS_SR = 44100
+HOP_LENGTH = 512
+
+# "fast" tier: degara beat tracking instead of multifeature, and key from a
+# bounded excerpt. Everything stays at ANALYSIS_SR: resampling cost more than
+# the half-rate key/onset passes saved, and ReplayGain rejects 22.05 kHz.
+# See bench_analysis.py for its accuracy.
+ANALYSIS_TIERS = ('full', 'fast')
+FAST_EXCERPT_SECONDS = 90
 
 MUSICKEY_TO_CAMELOT = {
     'C': '8B', 'C#': '3B', 'D': '10B', 'D#': '5B', 'E': '12B', 'F': '7B',
@@ -25,26 +40,128 @@ def camelot_from_key(key_name, scale):
         key += 'm'
     return MUSICKEY_TO_CAMELOT.get(key, "Unknown")
 
-def analyze_song(audio_path):
-    # Load audio (mono)
-    loader = es.MonoLoader(filename=audio_path)
-    audio = loader()
+@dataclass
+class AnalysisResult:
+    bpm: float
+    beats: np.ndarray
+    key: str
+    scale: str
+    camelot: str
+    loudness: float
+    energy: float
+    duration: float
+    downbeats: np.ndarray = None
+    onset_env: np.ndarray = None
+    chorus_windows: dict = None
+    tier: str = 'full'
+
+    def beats_between(self, start_sec, end_sec):
+        # Beat times inside [start_sec, end_sec), relative to start_sec
+        beats = np.asarray(self.beats)
+        return beats[(beats >= start_sec) & (beats < end_sec)] - start_sec
+
+    def chorus_start(self, duration):
+        # Start (ms) of the strongest window of the given length, or None when
+        # there is no onset envelope to search
+        if self.chorus_windows and duration in self.chorus_windows:
+            return self.chorus_windows[duration][0]
+        if self.onset_env is None:
+            return None
+        return find_chorus_start(self.onset_env, duration)
+
+    def features(self):
+        # Columns of the songs table / transition scoring inputs
+        return {
+            'bpm': round(float(self.bpm), 2),
+            'camelot_key': self.camelot,
+            'loudness': round(float(self.loudness), 2),
+            'energy': float(self.energy)
+        }
+
+def find_downbeats(beats, onset_env, beats_per_bar=4):
+    # Pick the bar phase whose beats carry the most onset strength
+    beats = np.asarray(beats)
+    if len(beats) == 0:
+        return beats
+    frames = np.clip((beats * ANALYSIS_SR / HOP_LENGTH).astype(int), 0, len(onset_env) - 1)
+    strength = onset_env[frames]
+    phase = max(range(min(beats_per_bar, len(beats))), key=lambda p: strength[p::beats_per_bar].mean())
+    return beats[phase::beats_per_bar]
+
+def find_chorus_start(onset_env, duration, sr=ANALYSIS_SR, hop_length=HOP_LENGTH):
+    # Strongest window of `duration` seconds, as a sliding sum over a
+    # cumulative sum so it's O(n) regardless of the window length
+    window_length = int(duration * sr / hop_length)
+    if window_length <= 0 or window_length >= len(onset_env):
+        return 0
+    cumulative = np.concatenate(([0.0], np.cumsum(onset_env, dtype=np.float64)))
+    energy = cumulative[window_length:] - cumulative[:-window_length]
+    max_pos = int(np.argmax(energy))
+    start_time_sec = max_pos * hop_length / sr
+    return int(start_time_sec * 1000)
 
-    # Tempo (BPM)
-    rhythm_extractor = es.RhythmExtractor2013(method="multifeature")
-    bpm, _, _, _, _ = rhythm_extractor(audio)
+def load_mono(audio_path):
+    if audio_path.endswith('.npy'):
+        # Already decoded PCM; skip ffmpeg entirely
+        wav, rate = load_array(audio_path)
+        mono = wav.mean(axis=0)
+        if rate != ANALYSIS_SR:
+            mono = librosa.resample(mono, orig_sr=rate, target_sr=ANALYSIS_SR)
+        return mono.astype(np.float32)
+    loader = es.MonoLoader(filename=audio_path, sampleRate=ANALYSIS_SR)
+    return loader()
+
+def middle_excerpt(audio, sr, seconds):
+    length = int(seconds * sr)
+    if len(audio) <= length:
+        return audio
+    start = (len(audio) - length) // 2
+    return audio[start:start + length]
+
+def analyze_audio(audio, sr=ANALYSIS_SR, tier='full'):
+    if tier not in ANALYSIS_TIERS:
+        raise ValueError(f"Unsupported analysis tier: {tier}")
+
+    # Tempo (BPM) and beat grid from a single rhythm extraction
+    rhythm_extractor = es.RhythmExtractor2013(method="multifeature" if tier == 'full' else "degara")
+    bpm, beats, _, _, _ = rhythm_extractor(audio)
+
+    key_audio = middle_excerpt(audio, sr, FAST_EXCERPT_SECONDS) if tier == 'fast' else audio
 
     # Key & scale
-    key_extractor = es.KeyExtractor()
-    key_str, scale, _ = key_extractor(audio)
+    key_extractor = es.KeyExtractor(sampleRate=sr)
+    key_str, scale, _ = key_extractor(key_audio)
     camelot = camelot_from_key(key_str, scale)
 
     # Loudness (dB)
-    replay_gain = es.ReplayGain()
+    replay_gain = es.ReplayGain(sampleRate=sr)
     loudness = replay_gain(audio)
 
     # Energy (normalized)
     energy = np.sum(audio ** 2)
     normalized_energy = energy / len(audio)
 
-    return round(bpm, 2), camelot, round(loudness, 2), normalized_energy
\ No newline at end of file
+    # Onset envelope for chorus detection, and a bar grid on top of the beats.
+    # The hop scales with the rate so frames always line up with ANALYSIS_SR/HOP_LENGTH.
+    onset_env = librosa.onset.onset_strength(y=audio, sr=sr, hop_length=HOP_LENGTH * sr // ANALYSIS_SR)
+    downbeats = find_downbeats(beats, onset_env)
+
+    return AnalysisResult(
+        bpm=float(bpm),
+        beats=np.asarray(beats),
+        key=key_str,
+        scale=scale,
+        camelot=camelot,
+        loudness=float(loudness),
+        energy=float(normalized_energy),
+        duration=len(audio) / sr,
+        downbeats=downbeats,
+        onset_env=onset_env,
+        tier=tier
+    )
+
+def analyze_song(audio_path, tier='full'):
+    # Load audio (mono) once; everything downstream reuses the result
+    audio = load_mono(audio_path)
+    inc('audio_seconds', len(audio) / ANALYSIS_SR, 'Seconds of audio processed', stage='analysis')
+    return analyze_audio(audio, tier=tier)
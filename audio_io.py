@@ -0,0 +1,43 @@
+import os
+import numpy as np
+import librosa
+import soundfile as sf
+import torchaudio
+from pydub import AudioSegment
+
+# Set DEBUG_AUDIO=1 to also write intermediate stems/mixes to disk
+DEBUG_AUDIO = os.environ.get('DEBUG_AUDIO', '0') == '1'
+
+# Raw PCM library files are int16 (channels, samples) arrays at this rate
+NPY_SR = 44100
+
+def load_array(path):
+    # (channels, samples) float32 array and its rate. .npy is a memory copy,
+    # FLAC/WAV go through libsndfile, anything else (MP3, native webm/m4a
+    # downloads) through torchaudio's ffmpeg backend.
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.npy':
+        pcm = np.load(path)
+        return pcm.astype(np.float32) / 32767.0, NPY_SR
+    if ext in ('.flac', '.wav'):
+        samples, rate = sf.read(path, dtype='float32', always_2d=True)
+        return np.ascontiguousarray(samples.T), rate
+    wav, rate = torchaudio.load(path)
+    return wav.numpy(), rate
+
+def pcm_to_segment(pcm, rate):
+    # pcm: int16 array shaped (samples, channels), e.g. from Mixer.render
+    return AudioSegment(
+        data=np.ascontiguousarray(pcm).tobytes(),
+        sample_width=2,
+        frame_rate=rate,
+        channels=pcm.shape[1]
+    )
+
+def array_to_mono(samples, rate, sr=44100):
+    # Mono float32 at the rate essentia's extractors expect, from a
+    # (samples, channels) float array
+    mono = samples.mean(axis=1)
+    if rate != sr:
+        mono = librosa.resample(mono, orig_sr=rate, target_sr=sr)
+    return mono.astype(np.float32)
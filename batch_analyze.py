@@ -1,43 +1,106 @@
 import os
 import csv
-import sys
-from analyze import analyze_song
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from analyze import analyze_song, ANALYSIS_TIERS
+from sidecar import save_sidecar
+from library import SONG_EXTENSIONS
 
-def analyze_folder(folder_path, output_csv):
-    results = []
+FIELDNAMES = ['filename', 'bpm', 'camelot_key', 'loudness', 'energy', 'path', 'size', 'mtime']
 
+def find_songs(folder_path):
     for root, _, files in os.walk(folder_path):
         for file in files:
-            if file.lower().endswith('.mp3'):
+            if file.lower().endswith(SONG_EXTENSIONS):
                 file_path = os.path.join(root, file)
-                print(f"Analyzing {file_path}...")
-                try:
-                    bpm, camelot_key, loudness, energy = analyze_song(file_path)
-                    # Remove key and scale if present
-                    features = {
-                        'bpm': bpm,
-                        'camelot_key': camelot_key,
-                        'loudness': loudness,
-                        'energy': energy
-                    }
-                    features['filename'] = file
-                    results.append(features)
-                except Exception as e:
-                    print(f"Error processing {file}: {e}")
+                stat = os.stat(file_path)
+                yield file_path, file, stat.st_size, stat.st_mtime_ns
+
+def load_done(output_csv):
+    # (path, size, mtime) of every file already in a previous output. Rows cut
+    # off by a crash (or written before paths were recorded) are dropped and
+    # simply get analyzed again.
+    if not os.path.exists(output_csv):
+        return set(), []
+
+    with open(output_csv, newline='', encoding='utf-8') as f:
+        rows = [row for row in csv.DictReader(f) if row.get('path') and row.get('energy')]
+
+    done = {(row.get('path'), row.get('size'), row.get('mtime')) for row in rows}
+    return done, rows
+
+def analyze_file(file_path, file, size, mtime, sidecars=False, tier='full'):
+    analysis = analyze_song(file_path, tier=tier)
+    if sidecars:
+        save_sidecar(file_path, analysis)
+    features = analysis.features()
+    features['filename'] = file
+    features['path'] = file_path
+    features['size'] = size
+    features['mtime'] = mtime
+    return features
+
+def analyze_folder(folder_path, output_csv, workers=None, sidecars=False, tier='full'):
+    workers = workers or os.cpu_count() or 1
+    done, previous_rows = load_done(output_csv)
 
-    with open(output_csv, mode='w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=['filename', 'bpm', 'camelot_key', 'loudness', 'energy'])
+    on_disk = list(find_songs(folder_path))
+    songs = [song for song in on_disk if (song[0], str(song[2]), str(song[3])) not in done]
+
+    # Keep one row per path that is still on disk and unchanged; changed files
+    # get a fresh row below and deleted files drop out
+    redo = {song[0] for song in songs}
+    current = {song[0] for song in on_disk}
+    kept = {}
+    for row in previous_rows:
+        if row['path'] in current and row['path'] not in redo:
+            kept[row['path']] = row
+    previous_rows = list(kept.values())
+    print(f"{len(songs)} files to analyze ({len(previous_rows)} already in {output_csv}), {workers} workers")
+
+    # Rewrite whatever survived from a previous run, then stream new rows in
+    # as they finish so an interruption never loses completed work
+    tmp_csv = output_csv + '.tmp'
+    with open(tmp_csv, mode='w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDNAMES, extrasaction='ignore')
         writer.writeheader()
-        for row in results:
+        writer.writerows(previous_rows)
+    os.replace(tmp_csv, output_csv)
+
+    with open(output_csv, mode='a', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDNAMES, extrasaction='ignore')
+
+        def write(row):
             writer.writerow(row)
+            f.flush()
+
+        if workers == 1:
+            for song in songs:
+                print(f"Analyzing {song[0]}...")
+                try:
+                    write(analyze_file(*song, sidecars, tier))
+                except Exception as e:
+                    print(f"Error processing {song[1]}: {e}")
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {pool.submit(analyze_file, *song, sidecars, tier): song for song in songs}
+                for completed, future in enumerate(as_completed(futures), start=1):
+                    song = futures[future]
+                    try:
+                        write(future.result())
+                        print(f"[{completed}/{len(songs)}] Analyzed {song[0]}")
+                    except Exception as e:
+                        print(f"[{completed}/{len(songs)}] Error processing {song[1]}: {e}")
 
     print(f"\nAnalysis complete. Results saved to {output_csv}")
 
 if __name__ == "__main__":
-    if len(sys.argv) < 3:
-        print("Usage: python batch_analyze_to_csv.py <folder_path> <output_csv>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Analyze every mp3 in a folder into a CSV, resuming from a previous run.")
+    parser.add_argument('folder_path')
+    parser.add_argument('output_csv')
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument('--sidecars', action='store_true', help="also write a beat-grid .npz next to each mp3")
+    parser.add_argument('--tier', choices=ANALYSIS_TIERS, default='full', help="analysis tier (fast: downsampled, cheaper beat tracking)")
+    args = parser.parse_args()
 
-    folder = sys.argv[1]
-    csv_out = sys.argv[2]
-    analyze_folder(folder, csv_out)
+    analyze_folder(args.folder_path, args.output_csv, args.workers, args.sidecars, args.tier)
@@ -0,0 +1,63 @@
+import os
+import sys
+import time
+from analyze import load_mono, analyze_audio
+from find_best_transition import compatible_camelot_keys
+
+# Compares the fast analysis tier against the full one on a folder of
+# fixture tracks: per-file speedup plus BPM and Camelot agreement.
+BPM_TOLERANCE = 0.02
+
+def bpm_agrees(full_bpm, fast_bpm, allow_octave=False):
+    ratios = (1.0, 0.5, 2.0) if allow_octave else (1.0,)
+    return any(abs(fast_bpm * r - full_bpm) <= BPM_TOLERANCE * full_bpm for r in ratios)
+
+def bench(folder_path):
+    paths = sorted(
+        os.path.join(root, file)
+        for root, _, files in os.walk(folder_path)
+        for file in files
+        if file.lower().endswith('.mp3')
+    )
+    if not paths:
+        print(f"No mp3 fixtures found in {folder_path}")
+        return
+
+    totals = {'full': 0.0, 'fast': 0.0}
+    bpm_exact = bpm_octave = camelot_exact = camelot_compatible = 0
+
+    print(f"{'file':<40} {'full (s)':>9} {'fast (s)':>9} {'bpm full/fast':>15} {'key full/fast':>14}")
+    for path in paths:
+        # Decode once so only the analysis itself is timed
+        audio = load_mono(path)
+
+        start = time.perf_counter()
+        full = analyze_audio(audio, tier='full')
+        full_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        fast = analyze_audio(audio, tier='fast')
+        fast_seconds = time.perf_counter() - start
+
+        totals['full'] += full_seconds
+        totals['fast'] += fast_seconds
+        bpm_exact += bpm_agrees(full.bpm, fast.bpm)
+        bpm_octave += bpm_agrees(full.bpm, fast.bpm, allow_octave=True)
+        camelot_exact += full.camelot == fast.camelot
+        camelot_compatible += fast.camelot in compatible_camelot_keys(full.camelot)
+
+        print(f"{os.path.basename(path)[:40]:<40} {full_seconds:>9.2f} {fast_seconds:>9.2f} "
+              f"{full.bpm:>7.1f}/{fast.bpm:<7.1f} {full.camelot:>6}/{fast.camelot:<7}")
+
+    n = len(paths)
+    print(f"\n{n} tracks")
+    print(f"Total: full {totals['full']:.2f}s, fast {totals['fast']:.2f}s, speedup {totals['full'] / totals['fast']:.2f}x")
+    print(f"BPM within {BPM_TOLERANCE:.0%}: {bpm_exact / n:.0%} (allowing half/double tempo: {bpm_octave / n:.0%})")
+    print(f"Camelot identical: {camelot_exact / n:.0%} (compatible: {camelot_compatible / n:.0%})")
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python bench_analysis.py <fixture_folder>")
+        sys.exit(1)
+
+    bench(sys.argv[1])
@@ -0,0 +1,33 @@
+import sys
+import time
+import torch
+from models import get_separation_model, run_separation, separate_batch
+
+def bench(clip_seconds=30, max_batch=8, repeats=1):
+    model = get_separation_model()
+    samples = int(clip_seconds * model.samplerate)
+
+    print(f"Clip length: {clip_seconds}s, repeats: {repeats}")
+    print(f"{'batch':>5} {'separate (s)':>13} {'batched (s)':>12} {'speedup':>8} {'clips/s':>8}")
+
+    for batch_size in range(1, max_batch + 1):
+        clips = [torch.randn(model.audio_channels, samples) * 0.1 for _ in range(batch_size)]
+
+        start = time.perf_counter()
+        for _ in range(repeats):
+            for clip in clips:
+                run_separation(clip.unsqueeze(0))
+        separate_seconds = (time.perf_counter() - start) / repeats
+
+        start = time.perf_counter()
+        for _ in range(repeats):
+            separate_batch(clips)
+        batched_seconds = (time.perf_counter() - start) / repeats
+
+        print(f"{batch_size:>5} {separate_seconds:>13.2f} {batched_seconds:>12.2f} "
+              f"{separate_seconds / batched_seconds:>7.2f}x {batch_size / batched_seconds:>8.2f}")
+
+if __name__ == "__main__":
+    clip_seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 30
+    max_batch = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    bench(clip_seconds, max_batch)
@@ -0,0 +1,109 @@
+import threading
+import time
+import pandas as pd
+from scoring import columns_from_frame, best_transition_index
+from recommend import TransitionIndex
+
+CATALOG_REFRESH_SECONDS = 300
+
+class SongCatalog:
+    # In-process copy of the songs table, kept as columnar arrays for scoring.
+    # fetch_rows returns the full table as a list of dicts (Supabase in
+    # production, any local stand-in in tests). Inserts and deletes made by
+    # this process are applied locally; a full re-sync runs in the background
+    # once the copy is older than refresh_seconds, so lookups never wait on it
+    # after the first load.
+
+    def __init__(self, fetch_rows, refresh_seconds=CATALOG_REFRESH_SECONDS):
+        self.fetch_rows = fetch_rows
+        self.refresh_seconds = refresh_seconds
+        self.version = 0
+        self._rows = None
+        self._columns = None
+        self._index = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def refresh(self):
+        rows = {row['filename']: row for row in self.fetch_rows() or []}
+        with self._lock:
+            self._loaded_at = time.monotonic()
+            # version only moves when the contents do, so caches keyed on it
+            # survive the periodic re-sync
+            if rows == self._rows:
+                return
+            self._rows = rows
+            self._columns = None
+            self._index = None
+            self.version += 1
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"Catalog refresh failed: {e}")
+        finally:
+            self._refreshing = False
+
+    def _ensure_loaded(self):
+        if self._rows is None:
+            self.refresh()
+        elif time.monotonic() - self._loaded_at > self.refresh_seconds and not self._refreshing:
+            self._refreshing = True
+            threading.Thread(target=self._refresh_in_background, daemon=True).start()
+
+    def columns(self):
+        self._ensure_loaded()
+        with self._lock:
+            if self._columns is None:
+                df = pd.DataFrame(list(self._rows.values()), columns=['filename', 'bpm', 'camelot_key', 'loudness', 'energy'])
+                self._columns = columns_from_frame(df)
+            return self._columns
+
+    def index(self):
+        columns = self.columns()
+        with self._lock:
+            if self._index is None or self._index[0] is not columns:
+                self._index = (columns, TransitionIndex(columns))
+            return self._index[1]
+
+    def top_k(self, current_song_data, k=10):
+        return self.index().top_k(current_song_data, k)
+
+    def __len__(self):
+        self._ensure_loaded()
+        return len(self._rows)
+
+    def __contains__(self, filename):
+        self._ensure_loaded()
+        return filename in self._rows
+
+    def get(self, filename):
+        self._ensure_loaded()
+        return self._rows.get(filename)
+
+    def filenames(self):
+        self._ensure_loaded()
+        return list(self._rows)
+
+    def upsert(self, row):
+        self._ensure_loaded()
+        with self._lock:
+            self._rows[row['filename']] = dict(row)
+            self._columns = None
+            self._index = None
+            self.version += 1
+
+    def remove(self, filenames):
+        self._ensure_loaded()
+        with self._lock:
+            for filename in filenames:
+                self._rows.pop(filename, None)
+            self._columns = None
+            self._index = None
+            self.version += 1
+
+    def find_best_transition(self, current_song_data):
+        columns = self.columns()
+        return columns['filename'][best_transition_index(current_song_data, columns)]
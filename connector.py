@@ -1,62 +1,140 @@
 import os
-import re
-import shutil
-import unicodedata
-import pandas as pd
 from dotenv import load_dotenv
-from supabase import create_client, Client
-from search import search_and_download_youtube_song
-from analyze import analyze_song
-from find_best_transition import find_best_transition
-from transition import extract_chorus, split_audio, create_transition
+from search import make_safe_filename, search_youtube, download_youtube_song
+from resolver import SongResolver
+from library import song_path, find_song_file, copy_song, store_song
+from analyze import analyze_song, ANALYSIS_TIERS
+from sidecar import save_sidecar, library_analysis
+from catalog import SongCatalog
+from songs_repository import create_repository
+from jobs import report_progress
+from metrics import timed
+from transition import extract_chorus, split_audio_batch, create_transition, get_stretch_ratio, plan_transition, stem_windows, stream_prefix_ms
+from stream_render import StreamingMp3Writer
+from mixer import to_pcm16, ms_to_samples
 
 load_dotenv()
 
-SUPABASE_URL = os.environ.get('SUPABASE_URL')
-SUPABASE_KEY = os.environ.get('SUPABASE_KEY')
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+songs_repository = create_repository()
 
-def make_safe_filename(name: str) -> str:
-    name = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode('ascii')
-    return re.sub(r'[\\/:"*?<>|]', '_', name)
+def fetch_songs():
+    # Scoring only needs these columns; keyset pages past the 1000-row cap
+    with timed('supabase_fetch'):
+        return songs_repository.all(['filename', 'bpm', 'camelot_key', 'loudness', 'energy'])
+
+catalog = SongCatalog(fetch_songs)
+
+# 'fast' trades a little BPM/key accuracy for much quicker per-request analysis
+ANALYSIS_TIER = os.environ.get('ANALYSIS_TIER', 'full')
+# Checked on import so a bad value fails warmup instead of every search
+if ANALYSIS_TIER not in ANALYSIS_TIERS:
+    raise ValueError(f"Unsupported ANALYSIS_TIER {ANALYSIS_TIER!r}, expected one of: {', '.join(ANALYSIS_TIERS)}")
+
+resolver = SongResolver()
 
 def search_download(query: str, path: str, cookie_path: str):
-    current_song_name = search_and_download_youtube_song(query, path + '/current_song', cookie_path)
-    bpm, camelot, loudness, energy = analyze_song(path + '/current_song/song.mp3')
+    current_dir = os.path.join(path, "current_song")
+    with timed('resolve'):
+        video_id, current_song_name, library_name = resolver.resolve(query)
 
-    current_song_data = {
-        'bpm': bpm,
-        'camelot_key': camelot,
-        'loudness': loudness,
-        'energy': energy
-    }
+    if library_name is not None:
+        # Already in the library: no search, no download, analysis from the sidecar
+        print(f"Resolved '{query}' to library song {library_name}")
+        library_path = song_path(library_name)
+        with timed('library_copy'):
+            copy_song(library_path, current_dir)
+        with timed('analyze_song'):
+            current_analysis = library_analysis(library_path)
+        with timed('find_best_transition'):
+            transition_song_name = catalog.find_best_transition(current_analysis.features())
+        return library_name, transition_song_name, current_analysis
 
-    response = supabase.table('songs').select('*').execute()
-    df = pd.DataFrame(response.data or [])
+    if video_id is None:
+        report_progress('searching', 0.05)
+        with timed('search'):
+            video_id, current_song_name = search_youtube(query)
+        if video_id is None:
+            raise ValueError(f"No results found for query: {query}")
+    report_progress('downloading', 0.1)
+    with timed('download'):
+        downloaded_path = download_youtube_song(video_id, current_dir, cookie_path)
+    report_progress('analyzing', 0.25)
+    with timed('analyze_song'):
+        current_analysis = analyze_song(downloaded_path, tier=ANALYSIS_TIER)
+    current_song_data = current_analysis.features()
 
-    transition_song_name = find_best_transition(current_song_data, df)
+    with timed('find_best_transition'):
+        transition_song_name = catalog.find_best_transition(current_song_data)
 
     safe_name = make_safe_filename(current_song_name)
-    if safe_name not in df['filename'].values:
-        supabase.table('songs').upsert({
-            'filename': safe_name,
-            'bpm': float(bpm),
-            'camelot_key': camelot,
-            'loudness': float(loudness),
-            'energy': float(energy)
-        }, on_conflict="filename").execute()
+    if safe_name not in catalog:
+        row = {'filename': safe_name, **current_song_data}
+        with timed('supabase_upsert'):
+            songs_repository.upsert([row])
+        catalog.upsert(row)
+
+        with timed('store_song'):
+            write_path = store_song(downloaded_path, safe_name)
+            save_sidecar(write_path, current_analysis)
+    resolver.record(query, video_id, current_song_name, safe_name)
+
+    return safe_name, transition_song_name, current_analysis
+
+def transition_songs(output_dir: str, transition_type: str, current_analysis=None, transition_analysis=None, stream_to=None):
+    # Each song is decoded and rhythm-analyzed once; chorus beats are just a
+    # slice of the full-song beat grid. With stream_to the MP3 is encoded
+    # there progressively instead of to output_dir/dj_transition.mp3.
+    current_path = find_song_file(output_dir + "/current_song")
+    transition_path = find_song_file(output_dir + "/transition_song")
+    with timed('analyze_song'):
+        if current_analysis is None:
+            current_analysis = analyze_song(current_path)
+        if transition_analysis is None:
+            transition_analysis = analyze_song(transition_path)
 
-        song_path = os.path.join(path, "current_song", "song.mp3")
-        write_path = os.path.join('songs', f"{safe_name}.mp3")
-        shutil.copyfile(song_path, write_path)
+    # Choruses are sliced straight out of the decoded songs, no MP3 round trip
+    with timed('extract_chorus'):
+        current_start, current_end, current_chorus, current_rate = extract_chorus(
+            current_path, start_ms=current_analysis.chorus_start(30)
+        )
+        transition_start, transition_end, transition_chorus, transition_rate = extract_chorus(
+            transition_path, start_ms=transition_analysis.chorus_start(30)
+        )
 
-    return safe_name, transition_song_name
+    # Plan the cue points first so only the audio around them gets separated
+    beats_current = current_analysis.beats_between(current_start / current_rate, current_end / current_rate)
+    beats_transition = transition_analysis.beats_between(transition_start / transition_rate, transition_end / transition_rate)
+    stretch_ratio = get_stretch_ratio(output_dir, current_analysis, transition_analysis)
+    plan = plan_transition(beats_current, beats_transition, transition_type, stretch_ratio)
 
-def transition_songs(output_dir: str, transition_type: str):
-    extract_chorus(output_dir + "/current_song/song.mp3", output_dir + "/current_song/chorus.mp3")
-    split_audio(output_dir + '/current_song/chorus.mp3', output_dir + '/current_song')
+    writer, streamed_ms = None, 0
+    try:
+        if stream_to is not None:
+            # The opening plays unchanged, so it is audible before separation runs
+            with timed('stream_first_part'):
+                writer = StreamingMp3Writer(stream_to, current_rate, current_chorus.shape[0])
+                streamed_ms = stream_prefix_ms(plan, transition_type)
+                writer.write(to_pcm16(current_chorus[:, :ms_to_samples(streamed_ms, current_rate)].numpy().T))
+            report_progress('streaming', 0.45)
 
-    extract_chorus(output_dir + "/transition_song/song.mp3", output_dir + "/transition_song/chorus.mp3")
-    split_audio(output_dir + '/transition_song/chorus.mp3', output_dir + '/transition_song')
+        report_progress('separating', 0.5)
+        with timed('split_audio'):
+            stems_current, stems_transition = split_audio_batch(
+                [(current_chorus, current_rate), (transition_chorus, transition_rate)],
+                [output_dir + '/current_song', output_dir + '/transition_song'],
+                windows=stem_windows(plan, transition_type)
+            )
 
-    create_transition(output_dir, transition_type)
+        report_progress('mixing', 0.8)
+        with timed('create_transition'):
+            create_transition(
+                output_dir, transition_type, stems_current, stems_transition, current_rate, transition_rate,
+                beats_current=beats_current, beats_transition=beats_transition, stretch_ratio=stretch_ratio,
+                writer=writer, streamed_ms=streamed_ms
+            )
+    except Exception:
+        if writer is not None:
+            writer.abort()
+        raise
+    if writer is not None:
+        writer.close()
@@ -0,0 +1,172 @@
+import asyncio
+import contextvars
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# Demucs already serializes on its model lock, so a couple of workers keep the
+# GPU busy while the others download/analyze. Submissions beyond
+# JOB_QUEUE_LIMIT queued + running jobs are refused instead of piling up.
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))
+JOB_QUEUE_LIMIT = int(os.environ.get('JOB_QUEUE_LIMIT', '16'))
+# Finished jobs are kept this long for status polling
+JOB_TTL_SECONDS = int(os.environ.get('JOB_TTL_SECONDS', '3600'))
+
+JOB_STATES = ('queued', 'running', 'done', 'failed')
+
+_current_job = contextvars.ContextVar('current_job', default=None)
+
+class QueueFull(Exception):
+    pass
+
+def report_progress(stage, progress=None, **info):
+    # Called from anywhere in a pipeline; a no-op outside a job so the
+    # synchronous endpoints and scripts can share the same code. info is
+    # merged into the job's details (e.g. the folder of a streaming render).
+    job = _current_job.get()
+    if job is not None:
+        job.update(stage, progress, **info)
+
+class Job:
+    def __init__(self, kind):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = 'queued'
+        self.stage = 'queued'
+        self.progress = 0.0
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.info = {}
+        self.events = []
+        self._changed = threading.Condition()
+        # (event loop, asyncio.Event) of SSE handlers waiting in next_events
+        self._watchers = set()
+        with self._changed:
+            self._add_event()
+
+    def _add_event(self):
+        # Caller holds self._changed
+        self.events.append({
+            'status': self.status,
+            'stage': self.stage,
+            'progress': round(self.progress, 3),
+            'time': time.time(),
+            **self.info,
+        })
+        self._changed.notify_all()
+        for loop, wake in self._watchers:
+            try:
+                loop.call_soon_threadsafe(wake.set)
+            except RuntimeError:
+                # Loop already closed; its handler is gone too
+                pass
+
+    def update(self, stage, progress=None, status=None, **info):
+        with self._changed:
+            self.stage = stage
+            self.info.update(info)
+            if progress is not None:
+                self.progress = max(self.progress, min(1.0, float(progress)))
+            if status is not None:
+                self.status = status
+            self._add_event()
+
+    def finish(self, result=None, error=None):
+        with self._changed:
+            self.result = result
+            self.error = error
+            self.finished_at = time.time()
+            self.status = 'failed' if error is not None else 'done'
+            self.stage = self.status
+            if error is None:
+                self.progress = 1.0
+            self._add_event()
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed')
+
+    async def next_events(self, since, timeout=15.0):
+        # Events after index `since`; waits until there is one or timeout. The
+        # worker thread wakes an asyncio.Event, so an idle SSE watcher holds
+        # no executor thread and a disconnect cancels the wait straight away.
+        wake = asyncio.Event()
+        watcher = (asyncio.get_running_loop(), wake)
+        with self._changed:
+            if len(self.events) > since or self.finished:
+                return self.events[since:]
+            self._watchers.add(watcher)
+        try:
+            await asyncio.wait_for(wake.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._changed:
+                self._watchers.discard(watcher)
+        with self._changed:
+            return self.events[since:]
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'stage': self.stage,
+            'progress': round(self.progress, 3),
+            **self.info,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+        }
+
+class JobQueue:
+    def __init__(self, workers=JOB_WORKERS, limit=JOB_QUEUE_LIMIT, ttl=JOB_TTL_SECONDS):
+        self.limit = limit
+        self.ttl = ttl
+        self.jobs = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='job')
+
+    def submit(self, kind, fn, *args, **kwargs):
+        with self._lock:
+            self._expire()
+            if sum(1 for job in self.jobs.values() if not job.finished) >= self.limit:
+                raise QueueFull(f"Job queue is full ({self.limit} jobs pending)")
+            job = Job(kind)
+            self.jobs[job.id] = job
+        self._pool.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def _run(self, job, fn, args, kwargs):
+        token = _current_job.set(job)
+        try:
+            job.update('starting', 0.0, status='running')
+            job.finish(result=fn(*args, **kwargs))
+        except Exception as e:
+            print(f"Job {job.id} ({job.kind}) failed: {e}")
+            job.finish(error=str(e))
+        finally:
+            _current_job.reset(token)
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.finished and job.finished_at < cutoff]:
+            del self.jobs[job_id]
+
+    def stats(self):
+        with self._lock:
+            counts = {state: 0 for state in JOB_STATES}
+            for job in self.jobs.values():
+                counts[job.status] += 1
+        return {**counts, 'limit': self.limit}
+
+job_queue = JobQueue()
@@ -0,0 +1,111 @@
+import os
+import shutil
+import numpy as np
+import soundfile as sf
+import librosa
+from pydub import AudioSegment
+from mutagen.mp3 import MP3
+from mutagen.id3 import ID3, APIC
+from audio_io import NPY_SR, load_array
+
+# NATIVE_CODEC=1 keeps whatever stream YouTube serves (opus/webm, m4a) instead
+# of transcoding every download to MP3.
+# LIBRARY_FORMAT picks how songs/ stores songs:
+#   mp3  - as before, smallest, slowest to decode
+#   flac - lossless, decodes several times faster than MP3
+#   npy  - raw int16 PCM at NPY_SR, no decoding at all (~10 MB/min stereo)
+NATIVE_CODEC = os.environ.get('NATIVE_CODEC', '0') == '1'
+LIBRARY_FORMATS = ('mp3', 'flac', 'npy')
+LIBRARY_FORMAT = os.environ.get('LIBRARY_FORMAT', 'mp3')
+LIBRARY_DIR = 'songs'
+
+# Fastest to decode first, so a song stored in several formats loads the cheap one
+SONG_EXTENSIONS = ('.npy', '.flac', '.wav', '.mp3', '.m4a', '.opus', '.webm', '.ogg')
+
+def find_song_file(directory, stem='song'):
+    for ext in SONG_EXTENSIONS:
+        path = os.path.join(directory, stem + ext)
+        if os.path.exists(path):
+            return path
+    return None
+
+def song_path(name, library_dir=LIBRARY_DIR):
+    return find_song_file(library_dir, name)
+
+def thumbnail_path(audio_path):
+    return os.path.splitext(audio_path)[0] + '.jpg'
+
+def extract_thumbnail(audio_path, output_image_path):
+    # Native downloads and FLAC/npy library songs keep the thumbnail beside the audio
+    image_path = thumbnail_path(audio_path)
+    if os.path.exists(image_path):
+        shutil.copyfile(image_path, output_image_path)
+        print(f"Thumbnail saved to {output_image_path}")
+        return True
+
+    if not audio_path.endswith('.mp3'):
+        print("No thumbnail found.")
+        return False
+
+    audio = MP3(audio_path, ID3=ID3)
+
+    if audio.tags is None:
+        print("No ID3 tags found.")
+        return False
+
+    for tag in audio.tags.values():
+        if isinstance(tag, APIC):
+            with open(output_image_path, 'wb') as img:
+                img.write(tag.data)
+            print(f"Thumbnail saved to {output_image_path}")
+            return True
+
+    print("No embedded thumbnail found.")
+    return False
+
+def copy_song(source_path, output_dir, stem='song'):
+    # Copies a song (and its thumbnail) to output_dir/song.<ext>
+    os.makedirs(output_dir, exist_ok=True)
+    dest_path = os.path.join(output_dir, stem + os.path.splitext(source_path)[1])
+    shutil.copyfile(source_path, dest_path)
+    if os.path.exists(thumbnail_path(source_path)):
+        shutil.copyfile(thumbnail_path(source_path), thumbnail_path(dest_path))
+    return dest_path
+
+def store_song(source_path, name, library_dir=LIBRARY_DIR, library_format=LIBRARY_FORMAT):
+    # Writes a downloaded song into the library in library_format and returns
+    # its path. The song is decoded at most once here so every later load is cheap.
+    if library_format not in LIBRARY_FORMATS:
+        raise ValueError(f"Unsupported library format: {library_format}")
+
+    os.makedirs(library_dir, exist_ok=True)
+    write_path = os.path.join(library_dir, f"{name}.{library_format}")
+    tmp_path = f"{write_path}.tmp.{library_format}"
+
+    if os.path.splitext(source_path)[1].lower() == f".{library_format}":
+        shutil.copyfile(source_path, tmp_path)
+    elif library_format == 'mp3':
+        AudioSegment.from_file(source_path).export(tmp_path, format='mp3', bitrate='192k')
+    else:
+        wav, rate = load_array(source_path)
+        if library_format == 'npy':
+            if rate != NPY_SR:
+                wav = librosa.resample(wav, orig_sr=rate, target_sr=NPY_SR)
+            np.save(tmp_path, (np.clip(wav, -1.0, 1.0) * 32767).astype(np.int16))
+        else:
+            sf.write(tmp_path, wav.T, rate, format='FLAC', subtype='PCM_16')
+    os.replace(tmp_path, write_path)
+
+    # FLAC/npy can't carry the MP3's embedded cover, so keep it as a file
+    image_path = thumbnail_path(write_path)
+    if not write_path.endswith('.mp3') or os.path.exists(thumbnail_path(source_path)):
+        extract_thumbnail(source_path, image_path)
+
+    return write_path
+
+def remove_song(path):
+    for file_path in (path, thumbnail_path(path)):
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            pass
@@ -1,29 +1,33 @@
+import time
+APP_IMPORT_START = time.perf_counter()
+
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 from dotenv import load_dotenv
 import os
-from connector import search_download, transition_songs
 import tempfile
 import uuid
 import asyncio
+import json
 import shutil
 import urllib.parse
-from mutagen.mp3 import MP3
-from mutagen.id3 import ID3, APIC
 from typing import List
-from supabase import create_client, Client
-from playlist.connector_playlist import connector_playlist
+from jobs import job_queue, report_progress, QueueFull
+from stream_render import STREAM_RENDER, is_rendering, reserve, discard
+from output_store import output_store, output_path
+from warmup import warmup
+import metrics
+
+# Only light modules are imported above. The ML stack (torch, demucs,
+# essentia, librosa) and the Supabase client come in through connector and
+# friends, which routes import where they are used and the startup warmup
+# thread loads ahead of time. Until that finishes /readyz answers 503.
 
 app = FastAPI()
 load_dotenv()
 
 FRONTEND_URL = os.environ.get('FRONTEND_URL')
-url = os.environ.get('SUPABASE_URL')
-key = os.environ.get('SUPABASE_KEY')
-
-supabase: Client = create_client(url, key)
-
 cookie_path = 'cookies.txt'
 
 app.add_middleware(
@@ -34,104 +38,267 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def server_timing(request: Request, call_next):
+    # Per-request stage breakdown (see metrics.timed) as a Server-Timing header
+    timings = metrics.start_request_timings()
+    start = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - start
+    route = request.scope.get('route')
+    metrics.observe('http_request_seconds', elapsed, 'HTTP request latency', path=route.path if route else 'unmatched')
+    metrics.inc('http_requests', 1, 'HTTP requests', path=route.path if route else 'unmatched', status=response.status_code)
+    response.headers['Server-Timing'] = metrics.server_timing_header(timings, elapsed)
+    return response
+
+metrics.gauge('job_queue', job_queue.stats, 'Jobs by state')
+metrics.gauge('output_store', output_store.stats, 'Rendered output disk usage')
+metrics.gauge('startup_seconds', lambda: {k: v for k, v in startup_timings().items() if v is not None}, 'Cold start: main import and time to ready')
+
+@app.get('/metrics')
+def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+def _load_pipeline():
+    import connector
+    import playlist.connector_playlist
+
+def _warm_models():
+    from models import warm_models
+    warm_models()
+
+def _check_analysis():
+    # Runs the configured analysis tier once on a short click track, so a tier
+    # that cannot run fails warmup instead of every search
+    import numpy as np
+    from analyze import analyze_audio, ANALYSIS_SR
+    from connector import ANALYSIS_TIER
+    clicks = np.zeros(ANALYSIS_SR * 10, dtype=np.float32)
+    clicks[::ANALYSIS_SR // 2] = 1.0
+    analyze_audio(clicks, tier=ANALYSIS_TIER)
+
+def _load_catalog():
+    from connector import catalog
+    len(catalog)
+
+def _register_pipeline_gauges():
+    from connector import catalog, resolver
+    from render_cache import render_cache
+    from stem_cache import stem_cache
+    metrics.gauge('stem_cache', stem_cache.stats, 'Stem cache hits and misses')
+    metrics.gauge('render_cache', render_cache.stats, 'Render cache entries, hits and misses')
+    metrics.gauge('resolver', resolver.stats, 'Query resolver hits and misses')
+    metrics.gauge('catalog_songs', lambda: len(catalog), 'Songs in the in-process catalog')
+
+@app.on_event("startup")
+def start_warmup():
+    # Returns immediately; the server takes traffic while this runs
+    output_store.start()
+    warmup.start([
+        ('import_pipeline', _load_pipeline),
+        ('warm_models', _warm_models),
+        ('check_analysis', _check_analysis),
+        ('load_catalog', _load_catalog),
+        ('register_gauges', _register_pipeline_gauges),
+    ])
+
 @app.get("/")
 def root():
     return {"message": "We-DJ backend is running!"}
 
-@app.get('/api/search_song')
-async def search_song(query: str, transition_type='crossfade'):
-    return await asyncio.to_thread(_search_and_transition, query, transition_type)
+@app.get('/healthz')
+def healthz():
+    # Liveness: the process is up and serving, regardless of warmup
+    return {"status": "alive"}
+
+@app.get('/readyz')
+def readyz():
+    # Readiness: models, pipeline modules and the catalog are loaded
+    content = {**warmup.report(), **startup_timings()}
+    return JSONResponse(status_code=200 if warmup.ready() else 503, content=content)
 
-def extract_thumbnail(mp3_path, output_image_path):
-    audio = MP3(mp3_path, ID3=ID3)
+def startup_timings():
+    return {
+        'import_seconds': APP_IMPORT_SECONDS,
+        'ready_seconds': round(warmup.finished_at - APP_IMPORT_START, 3) if warmup.ready() else None,
+    }
 
-    if audio.tags is None:
-        print("No ID3 tags found.")
-        return
+@app.get('/api/model_timings')
+def get_model_timings():
+    from models import model_timings
+    return model_timings()
 
-    for tag in audio.tags.values():
-        if isinstance(tag, APIC):
-            with open(output_image_path, 'wb') as img:
-                img.write(tag.data)
-            print(f"Thumbnail saved to {output_image_path}")
-            return
-    
-    print("No embedded thumbnail found.")
+@app.get('/api/resolver_stats')
+def get_resolver_stats():
+    from connector import resolver
+    return resolver.stats()
+
+@app.get('/api/search_song')
+async def search_song(query: str, transition_type='crossfade'):
+    return JSONResponse(content=await asyncio.to_thread(_search_and_transition, query, transition_type))
 
 def _search_and_transition(query: str, transition_type: str):
+    from connector import search_download, transition_songs, catalog
+    from library import song_path, find_song_file, copy_song, extract_thumbnail
+    from render_cache import render_cache, file_digest
+    from sidecar import library_analysis
+
     with tempfile.TemporaryDirectory(prefix="transition_") as temp_dir:
         current_dir = os.path.join(temp_dir, "current_song")
         transition_dir = os.path.join(temp_dir, "transition_song")
         os.makedirs(current_dir, exist_ok=True)
         os.makedirs(transition_dir, exist_ok=True)
 
-        current_song_name, transition_song_name = search_download(query, temp_dir, cookie_path)
-        transition_song_name = f"{transition_song_name}.mp3"
-        current_song_name = f"{current_song_name}.mp3"
+        current_song_name, transition_song_name, current_analysis = search_download(query, temp_dir, cookie_path)
+        # Same song, same match, same catalog: reuse the earlier render. The
+        # digest is of the library copy, which fresh downloads and library
+        # hits share (the download itself differs once transcoded to flac/npy).
+        current_song_path = song_path(current_song_name)
+        cache_key = render_cache.key(
+            file_digest(current_song_path or find_song_file(current_dir)), transition_song_name, transition_type
+        )
+        catalog_version = catalog.version
+        cached = render_cache.get(cache_key, catalog_version)
+        if cached is not None:
+            report_progress('cached', 1.0, folder=cached['folder'])
+            return cached['response']
 
-        transition_song = os.path.join('songs', transition_song_name)
-        transition_path = os.path.join(transition_dir, "song.mp3")
-        shutil.copyfile(transition_song, transition_path)
-        
-        # Transition Type Selection
-        transition_songs(temp_dir, transition_type)
+        transition_song = song_path(transition_song_name)
+        copy_song(transition_song, transition_dir)
+        # Library songs may be mp3, flac or npy; report the stored file's name
+        transition_song_name = os.path.basename(transition_song)
+        if current_song_path is not None:
+            current_song_name = os.path.basename(current_song_path)
 
         folder_uuid = str(uuid.uuid4())
         uuid_folder = os.path.join("temp", folder_uuid)
         os.makedirs(uuid_folder, exist_ok=True)
 
-        extract_thumbnail(current_dir + "/song.mp3", os.path.join(uuid_folder, "current.jpg"))
-        extract_thumbnail(transition_dir + "/song.mp3", os.path.join(uuid_folder, "transition.jpg"))
+        extract_thumbnail(find_song_file(current_dir), os.path.join(uuid_folder, "current.jpg"))
+        extract_thumbnail(find_song_file(transition_dir), os.path.join(uuid_folder, "transition.jpg"))
 
-        final_mp3 = os.path.join(temp_dir, "dj_transition.mp3")
+        # Transition Type Selection. When streaming, the MP3 is encoded
+        # straight into the output folder and /api/stream_song can serve it
+        # from the first part on.
         output_path = os.path.join(uuid_folder, "dj_transition.mp3")
-        shutil.move(final_mp3, output_path)
+        stream_path = output_path if STREAM_RENDER else None
+        if stream_path is not None:
+            # The file exists and counts as rendering before anyone is told
+            # about the folder, so an immediate /api/stream_song finds it
+            reserve(stream_path)
+        report_progress('transition', 0.4, folder=folder_uuid, streaming=STREAM_RENDER)
+        try:
+            transition_songs(temp_dir, transition_type, current_analysis, library_analysis(transition_song), stream_to=stream_path)
+        except Exception:
+            if stream_path is not None:
+                discard(stream_path)
+            raise
+
+        if stream_path is None:
+            report_progress('saving', 0.95)
+            shutil.move(os.path.join(temp_dir, "dj_transition.mp3"), output_path)
 
-    response = JSONResponse(content={
+    response = {
         "folder": folder_uuid,
         "current-song": urllib.parse.quote(current_song_name),
         "transition-song": urllib.parse.quote(transition_song_name)
-    })
-    
+    }
+    render_cache.put(cache_key, catalog_version, folder_uuid, response=response)
     return response
 
 @app.get('/api/get_song')
-def get_song(song_uuid: str):
-    return FileResponse(
-        path=f'temp/{song_uuid}/dj_transition.mp3',
-        media_type="audio/mpeg",
-        filename="dj_transition.mp3"
-    )
+async def get_song(request: Request, song_uuid: str):
+    path = output_path('temp', song_uuid, 'dj_transition.mp3')
+    if path is not None and is_rendering(path):
+        # Still growing, so no validators or ranges yet
+        return await stream_song(song_uuid)
+    return output_store.serve_file(request, path, "audio/mpeg", "dj_transition.mp3")
+
+@app.get('/api/stream_song')
+async def stream_song(song_uuid: str):
+    # Serves dj_transition.mp3 while it is still being rendered, following
+    # the file as parts are appended until the render finishes
+    path = output_path('temp', song_uuid, 'dj_transition.mp3')
+    if path is None or not os.path.exists(path):
+        return JSONResponse(status_code=404, content={"error": f"Unknown song: {song_uuid}"})
+
+    async def follow():
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(64 * 1024)
+                if chunk:
+                    yield chunk
+                elif is_rendering(path):
+                    await asyncio.sleep(0.25)
+                else:
+                    rest = f.read()
+                    if rest:
+                        yield rest
+                    return
+
+    return StreamingResponse(follow(), media_type="audio/mpeg")
 
 @app.get('/api/get_thumbnail')
-def get_thumbnail(song_uuid: str, thumbnail_type: str):
-    return FileResponse(f'temp/{song_uuid}/{thumbnail_type}.jpg', media_type="image/jpeg")
+def get_thumbnail(request: Request, song_uuid: str, thumbnail_type: str):
+    return output_store.serve_file(request, output_path('temp', song_uuid, f'{thumbnail_type}.jpg'), "image/jpeg")
 
 @app.get('/api/get_all_songs')
 def get_all_songs():
-    response = supabase.table("songs").select("filename").execute()
-    filenames = [item["filename"] for item in response.data]
-    return filenames
+    from connector import songs_repository
+    return [row["filename"] for row in songs_repository.iter_all(["filename"])]
+
+@app.get('/api/songs')
+def list_songs(after: str = None, limit: int = 100, fields: str = None):
+    # Keyset-paginated listing: pass the returned `next` as `after`
+    from connector import songs_repository
+    try:
+        rows, cursor = songs_repository.page(
+            after=after, limit=max(1, min(limit, 1000)), fields=fields.split(',') if fields else None
+        )
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    return {"items": rows, "next": cursor}
+
+@app.get('/api/recommend')
+def recommend(filename: str, k: int = 10):
+    from connector import catalog
+    song = catalog.get(filename)
+    if song is None:
+        return JSONResponse(status_code=404, content={"error": f"Unknown song: {filename}"})
+
+    return [
+        {"filename": name, "score": score}
+        for name, score in catalog.top_k(song, max(1, min(k, 100)))
+    ]
 
 @app.post('/api/delete_songs')
 async def delete_songs(request: Request):
     data = await request.json()
     song_ids: List[str] = data.get("song_ids", [])
+    return await asyncio.to_thread(_delete_songs, song_ids)
+
+def _delete_songs(song_ids: List[str]):
+    from connector import catalog, songs_repository
+    from library import song_path, remove_song
+    from sidecar import remove_sidecar
 
     not_deleted = []
 
     for song_id in song_ids:
         file_path = os.path.join('songs', song_id)
-        if os.path.exists(file_path):
+        if not os.path.exists(file_path):
+            file_path = song_path(song_id)
+        if file_path is not None:
             try:
-                os.remove(file_path)
+                remove_song(file_path)
+                remove_sidecar(file_path)
             except Exception:
                 not_deleted.append(song_id)
         else:
             not_deleted.append(song_id)
 
-    for sid in song_ids:
-        supabase.table("songs").delete().eq("filename", sid).execute()
+    songs_repository.delete(song_ids)
+    catalog.remove(song_ids)
 
     return {"not_deleted": not_deleted}
 
@@ -139,12 +306,74 @@ async def delete_songs(request: Request):
 async def create_playlist(request: Request):
     data = await request.json()
     tracks: List[str] = data.get("songs", [])
+    return await asyncio.to_thread(_create_playlist, tracks)
+
+def _create_playlist(tracks: List[str]):
+    # Imported here so the first call loads the pipeline off the event loop
+    from playlist.connector_playlist import connector_playlist
     return connector_playlist(tracks)
 
 @app.get('/api/get_playlist')
-async def get_playlist(playlist_uuid: str):
-    return FileResponse(
-        path=f'playlist/temp/{playlist_uuid}/playlist_transition.mp3',
-        media_type="audio/mpeg",
-        filename="playlist_transition.mp3"
-    )
\ No newline at end of file
+async def get_playlist(request: Request, playlist_uuid: str):
+    return output_store.serve_file(
+        request, output_path(os.path.join('playlist', 'temp'), playlist_uuid, 'playlist_transition.mp3'),
+        "audio/mpeg", "playlist_transition.mp3"
+    )
+
+@app.get('/api/output_stats')
+def get_output_stats():
+    from render_cache import render_cache
+    return {**output_store.stats(), 'render_cache': render_cache.stats()}
+
+def _submit(kind, fn, *args):
+    try:
+        job = job_queue.submit(kind, fn, *args)
+    except QueueFull as e:
+        return JSONResponse(status_code=429, content={"error": str(e)}, headers={"Retry-After": "30"})
+    return JSONResponse(status_code=202, content={"job_id": job.id, "status": job.status})
+
+@app.post('/api/jobs/search_song')
+def submit_search_song(query: str, transition_type='crossfade'):
+    return _submit('search_song', _search_and_transition, query, transition_type)
+
+@app.post('/api/jobs/create_playlist')
+async def submit_create_playlist(request: Request):
+    data = await request.json()
+    tracks: List[str] = data.get("songs", [])
+    return _submit('create_playlist', _create_playlist, tracks)
+
+@app.get('/api/jobs')
+def get_job_stats():
+    return job_queue.stats()
+
+@app.get('/api/jobs/{job_id}')
+def get_job(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": f"Unknown job: {job_id}"})
+    return job.to_dict()
+
+@app.get('/api/jobs/{job_id}/events')
+async def get_job_events(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": f"Unknown job: {job_id}"})
+
+    async def stream():
+        # Server-sent events: one per stage change, then the final job state
+        sent = 0
+        while True:
+            events = await job.next_events(sent)
+            for event in events:
+                yield f"event: progress\ndata: {json.dumps(event)}\n\n"
+            sent += len(events)
+            if job.finished and sent >= len(job.events):
+                yield f"event: {job.status}\ndata: {json.dumps(job.to_dict())}\n\n"
+                return
+            if not events:
+                yield ": keep-alive\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+APP_IMPORT_SECONDS = round(time.perf_counter() - APP_IMPORT_START, 3)
+print(f"main imported in {APP_IMPORT_SECONDS:.2f}s")
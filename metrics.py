@@ -0,0 +1,126 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# In-process metrics in the Prometheus text format, served by /metrics.
+# timed() feeds a per-stage latency histogram and, inside an HTTP request,
+# that request's Server-Timing breakdown.
+METRIC_PREFIX = 'wedj'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_gauges = {}
+_help = {}
+
+_request_timings = contextvars.ContextVar('request_timings', default=None)
+
+def _labels_key(labels):
+    return tuple(sorted(labels.items()))
+
+def _format_labels(labels, **extra):
+    pairs = list(labels) + sorted(extra.items())
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+def observe(name, value, help_text='', **labels):
+    with _lock:
+        _help.setdefault(name, help_text)
+        series = _histograms.setdefault(name, {})
+        key = _labels_key(labels)
+        if key not in series:
+            series[key] = {'buckets': [0] * len(LATENCY_BUCKETS), 'sum': 0.0, 'count': 0}
+        entry = series[key]
+        index = bisect.bisect_left(LATENCY_BUCKETS, value)
+        if index < len(LATENCY_BUCKETS):
+            entry['buckets'][index] += 1
+        entry['sum'] += value
+        entry['count'] += 1
+
+def inc(name, value=1, help_text='', **labels):
+    with _lock:
+        _help.setdefault(name, help_text)
+        series = _counters.setdefault(name, {})
+        key = _labels_key(labels)
+        series[key] = series.get(key, 0) + value
+
+def gauge(name, fn, help_text=''):
+    # fn() is called at scrape time and returns a number, or a dict of
+    # {label value: number} exported under a 'kind' label
+    with _lock:
+        _help[name] = help_text
+        _gauges[name] = fn
+
+@contextmanager
+def timed(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        observe('stage_seconds', elapsed, 'Pipeline stage latency', stage=stage)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + elapsed
+
+def start_request_timings():
+    # Fresh per-request breakdown; threads started with asyncio.to_thread
+    # copy the context and so add to the same dict
+    timings = {}
+    _request_timings.set(timings)
+    return timings
+
+def server_timing_header(timings, total):
+    entries = [f"{stage.replace(' ', '_')};dur={seconds * 1000:.1f}" for stage, seconds in timings.items()]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ', '.join(entries)
+
+def render():
+    lines = []
+    with _lock:
+        histograms = {name: {key: dict(entry, buckets=list(entry['buckets'])) for key, entry in series.items()} for name, series in _histograms.items()}
+        counters = {name: dict(series) for name, series in _counters.items()}
+        gauges = dict(_gauges)
+        help_texts = dict(_help)
+
+    for name, series in sorted(histograms.items()):
+        full_name = f"{METRIC_PREFIX}_{name}"
+        lines.append(f"# HELP {full_name} {help_texts.get(name) or name}")
+        lines.append(f"# TYPE {full_name} histogram")
+        for key, entry in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, entry['buckets']):
+                cumulative += count
+                lines.append(f"{full_name}_bucket{_format_labels(key, le=bound)} {cumulative}")
+            lines.append(f"{full_name}_bucket{_format_labels(key, le='+Inf')} {entry['count']}")
+            lines.append(f"{full_name}_sum{_format_labels(key)} {entry['sum']:.6f}")
+            lines.append(f"{full_name}_count{_format_labels(key)} {entry['count']}")
+
+    for name, series in sorted(counters.items()):
+        full_name = f"{METRIC_PREFIX}_{name}_total"
+        lines.append(f"# HELP {full_name} {help_texts.get(name) or name}")
+        lines.append(f"# TYPE {full_name} counter")
+        for key, value in sorted(series.items()):
+            lines.append(f"{full_name}{_format_labels(key)} {value}")
+
+    for name, fn in sorted(gauges.items()):
+        try:
+            value = fn()
+        except Exception as e:
+            print(f"Gauge {name} failed: {e}")
+            continue
+        full_name = f"{METRIC_PREFIX}_{name}"
+        lines.append(f"# HELP {full_name} {help_texts.get(name) or name}")
+        lines.append(f"# TYPE {full_name} gauge")
+        if isinstance(value, dict):
+            for kind, kind_value in sorted(value.items()):
+                lines.append(f"{full_name}{_format_labels((), kind=kind)} {kind_value}")
+        else:
+            lines.append(f"{full_name} {value}")
+
+    return '\n'.join(lines) + '\n'
@@ -1,23 +1,16 @@
 import pandas as pd
-from supabase import create_client, Client
 from dotenv import load_dotenv
-import os
+from songs_repository import create_repository
 
 load_dotenv()
 
-url = os.environ.get('SUPABASE_URL')
-key = os.environ.get('SUPABASE_KEY')
-supabase: Client = create_client(url, key)
+songs_repository = create_repository()
 
 df = pd.read_csv("song_metadata.csv")
-rows = df.to_dict(orient="records")
+# NaN isn't valid JSON; missing features go in as NULL
+df = df.astype(object).where(df.notna(), None)
+rows = df[["filename", "bpm", "camelot_key", "loudness", "energy"]].to_dict(orient="records")
 
-for row in rows:
-    data = {
-        "filename": row.get("filename"),
-        "bpm": row.get("bpm"),
-        "camelot_key": row.get("camelot_key"),
-        "loudness": row.get("loudness"),
-        "energy": row.get("energy")
-    }
-    supabase.table("songs").upsert(data, on_conflict="filename").execute()
+# Chunked bulk upserts: a few requests instead of one per song
+count = songs_repository.upsert(rows)
+print(f"Upserted {count} songs")
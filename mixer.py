@@ -0,0 +1,143 @@
+import numpy as np
+import librosa
+
+# Float32 mixing engine for transitions. A Mixer is one (samples, channels)
+# timeline; sources are summed into it in place at sample positions, with
+# equal-power fade envelopes applied only over the faded samples. Nothing is
+# clipped or quantized until render(), which runs a single limiter and TPDF
+# dither pass over the whole mix.
+LIMITER_CEILING = 0.999
+LIMITER_BLOCK_SECONDS = 0.005
+# Largest gain increase per block once a peak has passed (0 -> 1 over one second)
+LIMITER_RELEASE_PER_BLOCK = 0.005
+
+def ms_to_samples(ms, rate):
+    return int(ms) * rate // 1000
+
+def to_buffer(audio, rate=None, target_rate=None, channels=None):
+    # (samples, channels) float32 from a (channels, samples) torch tensor or a
+    # (samples, channels) array. Views are kept as they are; audio is only
+    # copied when it has to be resampled or remixed to target_rate/channels.
+    if hasattr(audio, 'numpy'):
+        audio = audio.numpy().T
+    audio = np.asarray(audio, dtype=np.float32)
+    if audio.ndim == 1:
+        audio = audio[:, None]
+    if target_rate is not None and rate is not None and rate != target_rate:
+        audio = librosa.resample(np.ascontiguousarray(audio.T), orig_sr=rate, target_sr=target_rate).T
+    if channels is not None and audio.shape[1] != channels:
+        audio = np.repeat(audio.mean(axis=1, keepdims=True), channels, axis=1)
+    return audio
+
+def equal_power_fade_in(length):
+    return np.sin(np.linspace(0.0, np.pi / 2, length, endpoint=False, dtype=np.float32))[:, None]
+
+def equal_power_fade_out(length):
+    return np.cos(np.linspace(0.0, np.pi / 2, length, endpoint=False, dtype=np.float32))[:, None]
+
+class Mixer:
+    def __init__(self, rate, channels=2, length=0):
+        self.rate = rate
+        self.channels = channels
+        self.length = 0
+        self.buffer = np.zeros((max(0, length), channels), dtype=np.float32)
+
+    def samples(self, ms):
+        return ms_to_samples(ms, self.rate)
+
+    def prepare(self, audio, rate=None):
+        return to_buffer(audio, rate, self.rate, self.channels)
+
+    def _reserve(self, length):
+        if length > len(self.buffer):
+            # Grow geometrically so repeated appends stay amortized O(n)
+            grown = np.zeros((max(length, int(len(self.buffer) * 1.5)), self.channels), dtype=np.float32)
+            grown[:self.length] = self.buffer[:self.length]
+            self.buffer = grown
+
+    def add(self, source, at, start=0, end=None, fade_in=0, fade_out=0, gain=1.0):
+        # Sums source[start:end] into the mix at sample `at`. fade_in/fade_out
+        # are sample counts at the start/end of that region. Anything before
+        # sample 0 of either the source or the mix is dropped, keeping the
+        # fade curves anchored to the requested region.
+        end = len(source) if end is None else min(int(end), len(source))
+        start, at = int(start), int(at)
+        total = end - start
+        skip = max(0, -start, -at)
+        if total - skip <= 0:
+            return
+        start, at = start + skip, at + skip
+        count = total - skip
+
+        self._reserve(at + count)
+        target = self.buffer[at:at + count]
+        region = source[start:end]
+
+        # Unfaded middle is a straight in-place add
+        fade_in = min(int(fade_in), total)
+        fade_out = min(int(fade_out), total - fade_in)
+        middle_start = max(0, fade_in - skip)
+        middle_end = count - min(count, fade_out)
+        if middle_end > middle_start:
+            if gain == 1.0:
+                target[middle_start:middle_end] += region[middle_start:middle_end]
+            else:
+                target[middle_start:middle_end] += gain * region[middle_start:middle_end]
+
+        if middle_start > 0:
+            envelope = equal_power_fade_in(fade_in)[skip:]
+            target[:middle_start] += region[:middle_start] * (gain * envelope)
+        if fade_out and middle_end < count:
+            envelope = equal_power_fade_out(fade_out)[fade_out - (count - middle_end):]
+            target[middle_end:] += region[middle_end:] * (gain * envelope)
+
+        self.length = max(self.length, at + count)
+
+    def append(self, source, start=0, end=None, **kwargs):
+        self.add(source, self.length, start, end, **kwargs)
+
+    def truncate(self, length):
+        length = max(0, min(int(length), self.length))
+        self.buffer[length:self.length] = 0
+        self.length = length
+
+    def mix(self):
+        return self.buffer[:self.length]
+
+    def render(self, dither=True):
+        # Final pass: limit the float mix in place, then quantize to int16 PCM
+        mix = self.mix()
+        limit(mix, self.rate)
+        return to_pcm16(mix, dither)
+
+def limit(mix, rate, ceiling=LIMITER_CEILING):
+    # Block-wise peak limiter. Each block's gain also covers its neighbours
+    # (attack before the peak), recovers slowly afterwards (release), and is
+    # interpolated per sample so there are no gain steps.
+    if len(mix) == 0:
+        return mix
+    block = max(1, int(rate * LIMITER_BLOCK_SECONDS))
+    blocks = -(-len(mix) // block)
+    padded = np.zeros((blocks * block,), dtype=np.float32)
+    padded[:len(mix)] = np.abs(mix).max(axis=1)
+    peaks = padded.reshape(blocks, block).max(axis=1)
+    if peaks.max() <= ceiling:
+        return mix
+
+    gain = np.minimum(1.0, ceiling / np.maximum(peaks, 1e-9))
+    gain = np.minimum(gain, np.minimum(np.r_[gain[1:], 1.0], np.r_[1.0, gain[:-1]]))
+    for i in range(1, blocks):
+        gain[i] = min(gain[i], gain[i - 1] + LIMITER_RELEASE_PER_BLOCK)
+
+    centers = np.arange(blocks) * block + block / 2
+    mix *= np.interp(np.arange(len(mix)), centers, gain).astype(np.float32)[:, None]
+    return mix
+
+def to_pcm16(mix, dither=True):
+    # TPDF dither (+/-1 LSB) before rounding to 16-bit
+    scaled = mix * 32767.0
+    if dither:
+        rng = np.random.default_rng()
+        scaled += rng.random(scaled.shape, dtype=np.float32)
+        scaled -= rng.random(scaled.shape, dtype=np.float32)
+    return np.clip(np.rint(scaled), -32768, 32767).astype(np.int16)
@@ -0,0 +1,82 @@
+import threading
+import time
+import torch
+from demucs.pretrained import get_model
+from demucs.apply import apply_model
+
+STEM_NAMES = ['drums', 'bass', 'other', 'vocals']
+DEFAULT_MODEL = 'htdemucs'
+
+_models = {}
+_model_locks = {}
+_registry_lock = threading.Lock()
+_timings = {}
+
+def get_device():
+    return 'mps' if torch.mps.is_available() else 'cuda' if torch.cuda.is_available() else 'cpu'
+
+def _warmup(model, device):
+    # One second of silence is enough to allocate buffers and trigger any lazy init
+    dummy = torch.zeros(1, model.audio_channels, int(model.samplerate))
+    with torch.no_grad():
+        apply_model(model, dummy, device=device, progress=False)
+
+def get_separation_model(name=DEFAULT_MODEL):
+    model = _models.get(name)
+    if model is not None:
+        return model
+
+    with _registry_lock:
+        if name not in _models:
+            device = get_device()
+
+            start = time.perf_counter()
+            model = get_model(name)
+            model.eval()
+            load_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            _warmup(model, device)
+            warmup_seconds = time.perf_counter() - start
+
+            _timings[name] = {
+                'device': device,
+                'load_seconds': round(load_seconds, 3),
+                'warmup_seconds': round(warmup_seconds, 3),
+            }
+            _model_locks[name] = threading.Lock()
+            _models[name] = model
+            print(f"Loaded {name} on {device} in {load_seconds:.2f}s (warmup {warmup_seconds:.2f}s)")
+
+    return _models[name]
+
+def run_separation(wav_batch, name=DEFAULT_MODEL):
+    # Inference is serialized per model: torch already spreads a single call
+    # across all cores, so concurrent requests would only fight over them
+    model = get_separation_model(name)
+    with _model_locks[name], torch.no_grad():
+        return apply_model(model, wav_batch, device=get_device())
+
+def warm_models(names=(DEFAULT_MODEL,)):
+    for name in names:
+        get_separation_model(name)
+
+def model_timings():
+    return dict(_timings)
+
+def separate_batch(clips, name=DEFAULT_MODEL):
+    # clips: list of (channels, samples) tensors. They are zero-padded to the
+    # longest clip so the whole list goes through a single apply_model call,
+    # then each clip's stems are trimmed back to its own length.
+    if not clips:
+        return []
+
+    lengths = [clip.shape[-1] for clip in clips]
+    max_length = max(lengths)
+    batch = torch.stack([
+        torch.nn.functional.pad(clip, (0, max_length - length))
+        for clip, length in zip(clips, lengths)
+    ])
+
+    sources = run_separation(batch, name)
+    return [sources[i, :, :, :length] for i, length in enumerate(lengths)]
@@ -0,0 +1,157 @@
+import os
+import shutil
+import threading
+import time
+import uuid
+from email.utils import formatdate, parsedate_to_datetime
+from fastapi.responses import FileResponse, JSONResponse, Response
+from stream_render import is_rendering
+
+# Rendered transitions live in temp/<uuid>/ and playlists in
+# playlist/temp/<uuid>/. Folders unused for OUTPUT_MAX_AGE_SECONDS are
+# deleted, and the least recently used go first once the total passes
+# OUTPUT_MAX_MB. Serving a file counts as a use.
+OUTPUT_ROOTS = ('temp', os.path.join('playlist', 'temp'))
+OUTPUT_MAX_MB = int(os.environ.get('OUTPUT_MAX_MB', '2048'))
+OUTPUT_MAX_AGE_SECONDS = int(os.environ.get('OUTPUT_MAX_AGE_SECONDS', str(24 * 3600)))
+OUTPUT_SWEEP_SECONDS = int(os.environ.get('OUTPUT_SWEEP_SECONDS', '600'))
+# Folders touched this recently may still be rendering and are never evicted
+OUTPUT_GRACE_SECONDS = 600
+
+def output_path(root, folder, name):
+    # folder comes from the client, so only real render ids are accepted
+    try:
+        folder = str(uuid.UUID(folder))
+    except ValueError:
+        return None
+    if os.path.basename(name) != name:
+        return None
+    return os.path.join(root, folder, name)
+
+def _folder_usage(folder):
+    # (bytes, last use, rendering) for one output folder
+    size, last_used, rendering = 0, os.stat(folder).st_mtime, False
+    for dirpath, _, files in os.walk(folder):
+        for name in files:
+            path = os.path.join(dirpath, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            size += stat.st_size
+            last_used = max(last_used, stat.st_mtime)
+            rendering = rendering or is_rendering(path)
+    return size, last_used, rendering
+
+class OutputStore:
+    def __init__(self, roots=OUTPUT_ROOTS, max_bytes=OUTPUT_MAX_MB * 1024 * 1024,
+                 max_age=OUTPUT_MAX_AGE_SECONDS, sweep_seconds=OUTPUT_SWEEP_SECONDS):
+        self.roots = roots
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.sweep_seconds = sweep_seconds
+        self.evicted = 0
+        self.total_bytes = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def touch(self, path):
+        # Marks the output folder holding path as just used
+        try:
+            os.utime(os.path.dirname(path))
+        except FileNotFoundError:
+            pass
+
+    def sweep(self):
+        with self._lock:
+            now = time.time()
+            folders = []
+            for root in self.roots:
+                if not os.path.isdir(root):
+                    continue
+                for name in os.listdir(root):
+                    folder = os.path.join(root, name)
+                    if not os.path.isdir(folder):
+                        continue
+                    try:
+                        size, last_used, rendering = _folder_usage(folder)
+                    except FileNotFoundError:
+                        continue
+                    folders.append((last_used, size, folder, rendering or now - last_used < OUTPUT_GRACE_SECONDS))
+
+            total = sum(size for _, size, _, _ in folders)
+            removed = 0
+            # Oldest first: expired folders always go, then more until under budget
+            for last_used, size, folder, busy in sorted(folders):
+                if busy:
+                    continue
+                if now - last_used <= self.max_age and total <= self.max_bytes:
+                    break
+                shutil.rmtree(folder, ignore_errors=True)
+                total -= size
+                removed += 1
+
+            self.total_bytes = total
+            self.evicted += removed
+            if removed:
+                print(f"Output store: evicted {removed} folders, {total / (1024 * 1024):.1f} MB left")
+            return removed
+
+    def _sweep_forever(self):
+        while True:
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Output sweep failed: {e}")
+            time.sleep(self.sweep_seconds)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._sweep_forever, daemon=True)
+            self._thread.start()
+
+    def stats(self):
+        return {
+            'total_bytes': self.total_bytes,
+            'max_bytes': self.max_bytes,
+            'max_age_seconds': self.max_age,
+            'evicted': self.evicted,
+        }
+
+    def serve_file(self, request, path, media_type, filename=None):
+        # FileResponse with validators: 304 for matching If-None-Match /
+        # If-Modified-Since, and Starlette's Range/If-Range handling for the rest
+        if path is None:
+            return JSONResponse(status_code=400, content={"error": "Invalid output id"})
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return JSONResponse(status_code=404, content={"error": "Output not found or expired"})
+
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        headers = {
+            'ETag': etag,
+            'Last-Modified': formatdate(stat.st_mtime, usegmt=True),
+            'Cache-Control': 'private, max-age=3600',
+        }
+        self.touch(path)
+        if _not_modified(request.headers, etag, stat.st_mtime):
+            return Response(status_code=304, headers=headers)
+        return FileResponse(path, media_type=media_type, filename=filename, headers=headers, stat_result=stat)
+
+def _not_modified(request_headers, etag, mtime):
+    if_none_match = request_headers.get('if-none-match')
+    if if_none_match is not None:
+        # If-None-Match wins over If-Modified-Since (RFC 9110); weak compare
+        tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+        return '*' in tags or etag in tags
+
+    if_modified_since = request_headers.get('if-modified-since')
+    if if_modified_since:
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+output_store = OutputStore()
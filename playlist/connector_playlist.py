@@ -4,13 +4,23 @@ import uuid
 from playlist.search_playlist import search_all
 from playlist.analyze_playlist import analyze_song_list, order_songs_for_transition
 from typing import List
+from jobs import report_progress
+from metrics import timed
 
 def connector_playlist(song_list: List[str]):
     folder_uuid = str(uuid.uuid4())
     uuid_folder = os.path.join("playlist", "temp", folder_uuid)
     os.makedirs(uuid_folder, exist_ok=True)
-    song_paths = search_all(song_list, uuid_folder, 'cookies.txt')
-    df = analyze_song_list(song_paths)
-    ordered_paths = order_songs_for_transition(df)
-    create_full_mix(uuid_folder, ordered_paths, output_file=uuid_folder+"/playlist_transition.mp3")
+    report_progress('downloading', 0.05)
+    with timed('playlist_download'):
+        song_paths = search_all(song_list, uuid_folder, 'cookies.txt')
+    report_progress('analyzing', 0.2)
+    with timed('analyze_song'):
+        df = analyze_song_list(song_paths)
+    report_progress('ordering', 0.35)
+    with timed('playlist_order'):
+        ordered_paths = order_songs_for_transition(df)
+    analyses = dict(zip(df['filepath'], df['analysis']))
+    report_progress('mixing', 0.4)
+    create_full_mix(uuid_folder, ordered_paths, output_file=uuid_folder+"/playlist_transition.mp3", analyses=analyses)
     return folder_uuid
\ No newline at end of file
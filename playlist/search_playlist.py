@@ -1,20 +1,26 @@
 import yt_dlp
 import os
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
+from library import NATIVE_CODEC, find_song_file
 
-def search_and_download(query, output_dir, cookie_path):
+# Downloads are network-bound, so a few run side by side
+MAX_CONCURRENT_DOWNLOADS = int(os.environ.get('MAX_CONCURRENT_DOWNLOADS', '4'))
+
+def search_and_download(query, output_dir, cookie_path, ydl_class=yt_dlp.YoutubeDL):
+    # ydl_class is swappable so tests can run against a local fake extractor
     search_opts = {
         'quiet': True,
         'skip_download': True,
         'extract_flat': True,
     }
 
-    with yt_dlp.YoutubeDL(search_opts) as ydl:
+    with ydl_class(search_opts) as ydl:
         search_query = f"ytsearch1:{query}"
         info = ydl.extract_info(search_query, download=False)
         if not info or not info.get('entries'):
             print(f"No results found for query: {query}")
-            return
+            return None
         first_result = info['entries'][0]
 
     youtube_url = f"https://www.youtube.com/watch?v={first_result.get('id')}"
@@ -22,8 +28,9 @@ def search_and_download(query, output_dir, cookie_path):
     download_opts = {
         'cookiefile': cookie_path,
         'format': 'bestaudio/best',
-        'outtmpl': output_dir,
-        'postprocessors': [
+        'outtmpl': output_dir + '.%(ext)s',
+        # NATIVE_CODEC keeps the served stream instead of transcoding to MP3
+        'postprocessors': [] if NATIVE_CODEC else [
             {
                 'key': 'FFmpegExtractAudio',
                 'preferredcodec': 'mp3',
@@ -34,16 +41,24 @@ def search_and_download(query, output_dir, cookie_path):
         'quiet': False,
     }
 
-    with yt_dlp.YoutubeDL(download_opts) as ydl:
+    with ydl_class(download_opts) as ydl:
         ydl.download([youtube_url])
 
-def search_all(queries: List[str], output_path: str, cookie_path: str):
-    paths = []
+    return find_song_file(os.path.dirname(output_dir), os.path.basename(output_dir)) or output_dir + ".mp3"
 
-    for index, query in enumerate(queries):
-        query = query + " official audio"
+def search_all(queries: List[str], output_path: str, cookie_path: str,
+               max_workers: int = MAX_CONCURRENT_DOWNLOADS, downloader=search_and_download):
+    # Returns the downloaded paths in query order. A failed or empty search
+    # only drops that song instead of aborting the whole playlist.
+    def fetch(index, query):
         song_path = os.path.join(output_path, str(index))
-        search_and_download(query, song_path, cookie_path)
-        paths.append(song_path + ".mp3")
+        try:
+            return downloader(query + " official audio", song_path, cookie_path)
+        except Exception as e:
+            print(f"Failed to download '{query}': {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        paths = list(pool.map(fetch, range(len(queries)), queries))
 
-    return paths
\ No newline at end of file
+    return [path for path in paths if path is not None]
@@ -1,281 +1,168 @@
-from pydub import AudioSegment
-import librosa
-import numpy as np
 import os
-from demucs.pretrained import get_model
-from demucs.apply import apply_model
-import torch
-import torchaudio
 import soundfile as sf
-import essentia
-import essentia.standard as es
-import numpy as np
-import os
-import soundfile as sf
-import pyrubberband as pyrb
+from analyze import analyze_song
+from jobs import report_progress
+from metrics import timed, inc
+from audio_io import DEBUG_AUDIO, load_array, pcm_to_segment, array_to_mono
+from mixer import Mixer, to_pcm16
+from transition import (
+    extract_chorus, split_audio_batch, load_stems, build_instrumental, get_beat_times_essentia,
+    get_stretch_ratio, match_bpm, plan_transition, stem_windows,
+    VOCALS_CROSSFADE_MS, TEASE_DURATION_MS, SCRATCH_LOOPS,
+)
 import uuid
 import shutil
 
-def extract_chorus(input_file, output_path, duration=60):
-    audio = AudioSegment.from_mp3(input_file)
-    samples = np.array(audio.get_array_of_samples()).astype(np.float32)
-
-    if audio.channels == 2:
-        samples = samples.reshape((-1, 2))
-        samples = samples.mean(axis=1)
-
-    sr = audio.frame_rate
-    onset_env = librosa.onset.onset_strength(y=samples, sr=sr)
-    hop_length = 512
-    frames_per_sec = sr / hop_length
-    window_length = int(duration * frames_per_sec)
-    energy = np.convolve(onset_env, np.ones(window_length), 'valid')
-    max_pos = np.argmax(energy)
-    start_time_sec = max_pos * hop_length / sr
-    start_ms = int(start_time_sec * 1000)
-    end_ms = start_ms + int(duration * 1000)
-    chorus = audio[start_ms:end_ms]
-    chorus.export(output_path, format="mp3")
-
-def split_audio(input_file, output_dir):
-    model = get_model('htdemucs')
-    wav, rate = torchaudio.load(input_file)
-    device = 'mps' if torch.mps.is_available() else 'cuda' if torch.cuda.is_available() else 'cpu'
-    sources = apply_model(model, wav.unsqueeze(0), device=device)
-    os.makedirs(output_dir, exist_ok=True)
-    for stem, name in zip(sources[0], ['drums', 'bass', 'other', 'vocals']):
-        output_path = os.path.join(output_dir, f"{name}.wav")
-        torchaudio.save(output_path, stem, rate)
-        print(f"Saved {name} to {output_path}")
-
-def build_instrumental(bass, drums, other):
-    return bass.overlay(drums).overlay(other)
-
-def get_beat_times_essentia(audio_path):
-    loader = es.MonoLoader(filename=audio_path)
-    audio = loader()
-
-    rhythm_extractor = es.RhythmExtractor2013(method="multifeature")
-    _, beats, _, _, _ = rhythm_extractor(audio)
-
-    return beats
-
-def get_bpm_essentia(audio, sr):
-    rhythm_extractor = es.RhythmExtractor2013(method="multifeature")
-    bpm, _, _, _, _ = rhythm_extractor(audio)
-    return bpm
-
-def match_bpm(songs_dir, target_path):
-    # Create two independent loader instances
-    loader1 = es.MonoLoader(filename=os.path.join(songs_dir, "current_song/song.mp3"))
-    source_audio = loader1()
-
-    # It's important NOT to reuse loader1 here
-    loader2 = es.MonoLoader(filename=os.path.join(songs_dir, "transition_song/song.mp3"))
-    target_audio = loader2()
-
-    sr = 44100
-    source_bpm = get_bpm_essentia(source_audio, sr)
-    target_bpm = get_bpm_essentia(target_audio, sr)
-
-    stretch_ratio = source_bpm / target_bpm
-
-    # Load stereo audio using soundfile for processing
-    y, stem_sr = sf.read(target_path)
-    y_stretched = pyrb.time_stretch(y, stem_sr, stretch_ratio)
-    y_stretched /= np.max(np.abs(y_stretched))
-
-    stem_path = os.path.splitext(target_path)[0] + "_matched.wav"
-    sf.write(stem_path, y_stretched, stem_sr)
-
-    print(f"CURRENT BPM: {source_bpm:.2f}")
-    print(f"TRANSITION BPM: {target_bpm:.2f}")
-
-    return stem_path, stretch_ratio
-
-def create_transition(songs_dir, vticf, transition_type="crossfade"):
-    # Load stems for current song
-    vocals_current = AudioSegment.from_file(songs_dir + "/current_song" + "/vocals.wav")
-    bass_current   = AudioSegment.from_file(songs_dir + "/current_song" + "/bass.wav")
-    drums_current  = AudioSegment.from_file(songs_dir + "/current_song" + "/drums.wav")
-    other_current  = AudioSegment.from_file(songs_dir + "/current_song" + "/other.wav")
-
-    # Load stems for transition song
-    vocals_transition = AudioSegment.from_file(songs_dir + "/transition_song" + "/vocals.wav")
-    bass_transition   = AudioSegment.from_file(songs_dir + "/transition_song" + "/bass.wav")
-    drums_transition  = AudioSegment.from_file(songs_dir + "/transition_song" + "/drums.wav")
-    other_transition  = AudioSegment.from_file(songs_dir + "/transition_song" + "/other.wav")
+# Playlists work on longer choruses and start each transition later than the
+# single-song endpoint; the helpers above are shared with it
+CHORUS_SECONDS = 60
+MIN_TIME_BEFORE_TRANSITION = 45
+
+def create_transition(songs_dir, vticf, transition_type="crossfade", stems_current=None, stems_transition=None, rate_current=None, rate_transition=None, beats_current=None, beats_transition=None, stretch_ratio=None):
+    # Stems come straight from split_audio at the given rates; fall back to
+    # WAVs on disk. Returns (a_cut, b_cut, vticf, mix) with the transition
+    # left unrendered on a float32 Mixer, so create_full_mix can splice it
+    # into the playlist without an MP3 round trip.
+    if stems_current is None:
+        stems_current, rate_current = load_stems(songs_dir + "/current_song")
+    if stems_transition is None:
+        stems_transition, rate_transition = load_stems(songs_dir + "/transition_song")
+
+    mix = Mixer(rate_current, stems_current['vocals'].shape[1])
+    rate = mix.rate
+
+    vocals_current = mix.prepare(stems_current['vocals'], rate_current)
+    bass_current   = mix.prepare(stems_current['bass'], rate_current)
+    drums_current  = mix.prepare(stems_current['drums'], rate_current)
+    other_current  = mix.prepare(stems_current['other'], rate_current)
+
+    vocals_transition = mix.prepare(stems_transition['vocals'], rate_transition)
+    bass_transition   = mix.prepare(stems_transition['bass'], rate_transition)
+    drums_transition  = mix.prepare(stems_transition['drums'], rate_transition)
+    other_transition  = mix.prepare(stems_transition['other'], rate_transition)
 
     # Build instrumentals
     instrumental_current = build_instrumental(bass_current, drums_current, other_current)
     instrumental_transition = build_instrumental(bass_transition, drums_transition, other_transition)
-    instrumental_current.export(songs_dir + "/current_song/instrumentals.wav", format="wav")
-    instrumental_transition.export(songs_dir + "/transition_song/instrumentals.wav", format="wav")
 
     # Combine vocals with instrumentals
-    song_current = instrumental_current.overlay(vocals_current)
-    song_transition = instrumental_transition.overlay(vocals_transition)
-
-    song_current_path = os.path.join(songs_dir, "current_song", "full_mix.wav")
-    song_transition_path = os.path.join(songs_dir, "transition_song", "full_mix.wav")
-
-    song_current.export(song_current_path, format="wav")
-    song_transition.export(song_transition_path, format="wav")
-
-    beats_current = get_beat_times_essentia(song_current_path)
-    beats_transition = get_beat_times_essentia(song_transition_path)
-    crossfade_beats = 4
-
-    # Desired minimum time before transition in seconds
-    min_time_before_transition = 45
-
-    # Find the beat index closest to min_time_before_transition
-    start_beat_idx = next((i for i, t in enumerate(beats_current) if t >= min_time_before_transition), 0)
-
-    fade_start_time_current = beats_current[start_beat_idx]
-    fade_end_time_current = beats_current[start_beat_idx + crossfade_beats]
-    fade_start_time_transition = beats_transition[8]  # you can also randomize or select more meaningfully
-
-    # Convert to milliseconds
-    vocals_current_down = int(fade_start_time_current * 1000)
-    vocals_transition_in = int(fade_end_time_current * 1000)
-    transition_start_time = int(fade_start_time_transition * 1000)
-    transition_start_other = vocals_current_down
-
-    # Convert to milliseconds
-    vocals_current_down = int(fade_start_time_current * 1000)
-    vocals_transition_in = int(fade_end_time_current * 1000)
-    transition_start_time = int(fade_start_time_transition * 1000)
-    transition_start_other = vocals_current_down
-    
-    a_cut = 60000-vticf
+    song_current = instrumental_current + vocals_current
+    song_transition = instrumental_transition + vocals_transition
+
+    if DEBUG_AUDIO:
+        sf.write(songs_dir + "/current_song/instrumentals.wav", instrumental_current, rate)
+        sf.write(songs_dir + "/transition_song/instrumentals.wav", instrumental_transition, rate)
+        sf.write(os.path.join(songs_dir, "current_song", "full_mix.wav"), song_current, rate)
+        sf.write(os.path.join(songs_dir, "transition_song", "full_mix.wav"), song_transition, rate)
+
+    if beats_current is None:
+        beats_current = get_beat_times_essentia(array_to_mono(song_current, rate))
+    if beats_transition is None:
+        beats_transition = get_beat_times_essentia(array_to_mono(song_transition, rate))
+
+    # vocals_crossover uses its own cue points, planned in its branch below
+    plan = plan_transition(beats_current, beats_transition, "crossfade" if transition_type == "vocals_crossover" else transition_type, min_time=MIN_TIME_BEFORE_TRANSITION)
+    vocals_current_down = plan['vocals_current_down']
+    vocals_transition_in = plan['vocals_transition_in']
+    transition_start_time = plan['transition_start_time']
+
+    a_cut = CHORUS_SECONDS * 1000 - vticf
     b_cut = vticf
 
+    # Cue points below are sample offsets on the mix timeline
+    samples = mix.samples
+
     if transition_type == "crossfade":
         crossfade_duration = vocals_transition_in - vocals_current_down
+        down = samples(vocals_current_down)
+        crossfade = samples(crossfade_duration)
+        transition_start = samples(transition_start_time)
 
         # Part 1: Intro from current song
-        full_current = song_current[:vocals_current_down]
-
-        # Part 2: Crossfade section
-        current_fade_out = instrumental_current[vocals_current_down:vocals_transition_in].fade_out(crossfade_duration)
-        current_fade_out = current_fade_out.overlay(vocals_current[vocals_current_down:vocals_transition_in].fade_out(int(crossfade_duration * 0.6)))
-        current_fade_out = current_fade_out.overlay(instrumental_transition[transition_start_time:transition_start_time+crossfade_duration].fade_in(crossfade_duration))
+        mix.add(song_current, 0, 0, down)
 
-        # Part 3: Bring in vocals from transition
-        transition_vocals_fade_in = vocals_transition[transition_start_time+crossfade_duration:transition_start_time+2*crossfade_duration].fade_in(crossfade_duration)
-        transition_vocals_fade_in = transition_vocals_fade_in.overlay(instrumental_transition[transition_start_time+crossfade_duration:])
+        # Part 2: Crossfade section, current vocals only fading over the last 60%
+        mix.add(instrumental_current, down, down, down + crossfade, fade_out=crossfade)
+        mix.add(vocals_current, down, down, down + crossfade, fade_out=int(crossfade * 0.6))
 
-        # Part 4: Remainder of transition
-        transition_remainder = vocals_transition[transition_start_time+2*crossfade_duration:].overlay(instrumental_transition[transition_start_time+2*crossfade_duration:])
+        # Transition instrumental fades in and plays on to the end
+        mix.add(instrumental_transition, down, transition_start, fade_in=crossfade)
 
-        # Final song
-        final_transition = full_current + current_fade_out + transition_vocals_fade_in + transition_remainder
-        output_file = songs_dir + "/dj_transition.mp3"
+        # Part 3: Bring in vocals from transition, which then play on to the end
+        mix.add(vocals_transition, down + crossfade, transition_start + crossfade, fade_in=crossfade)
 
         vticf = transition_start_time+2*crossfade_duration
 
-    elif transition_type == "scratch":
-        scratch_start = transition_start_other
-        full_current = song_current[:scratch_start]
-
-        scratch_loop = AudioSegment.from_file('transitions' + "/scratch_loop.wav")[:600]
+    elif transition_type in SCRATCH_LOOPS:
+        loop_path, loop_ms = SCRATCH_LOOPS[transition_type]
 
-        final_transition = full_current + scratch_loop + song_transition
-        output_file = songs_dir + "/dj_transition.mp3"
+        # Full song A up to the cue, the scratch loop, then the full transition
+        mix.add(song_current, 0, 0, samples(vocals_current_down))
+        loop, loop_rate = load_array(loop_path)
+        mix.append(mix.prepare(loop.T, loop_rate), end=samples(loop_ms))
+        mix.append(song_transition)
 
-    elif transition_type == "crazy_scratch":
-        scratch_start = transition_start_other
-
-        # Full song A
-        full_current = song_current[:scratch_start]
-
-        # Scratching
-        scratch_loop = AudioSegment.from_file('transitions' + "/crazy_scratch_loop.wav")[:750]
-
-        # Full transition
-        final_transition = full_current + scratch_loop + song_transition
-        output_file = songs_dir + "/dj_transition.mp3"
-    
     elif transition_type == "vocals_crossover":
 
-        # Desired minimum time before transition in seconds
-        min_time_before_transition = 45
+        if stretch_ratio is None:
+            stretch_ratio = get_stretch_ratio(songs_dir)
 
-        # Song A transition out timing
-        start_beat_idx = next((i for i, t in enumerate(beats_current) if t >= min_time_before_transition), 0)
-        fade_start_time_current = beats_current[start_beat_idx]
-        fade_end_time_current = beats_current[start_beat_idx + crossfade_beats]
+        plan = plan_transition(beats_current, beats_transition, transition_type, stretch_ratio)
+        vocals_current_down = plan['vocals_current_down']
+        vocals_transition_in = plan['vocals_transition_in']
 
-        # Song B transition in timing (matching the crossfade duration)
-        transition_start_beat_idx = 8  # or choose dynamically
-        fade_start_time_transition = beats_transition[transition_start_beat_idx]
-        fade_end_time_transition = beats_transition[transition_start_beat_idx + crossfade_beats]
+        vocals_b_matched, ratio1 = match_bpm(songs_dir, vocals_transition, rate, stretch_ratio)
 
-        # Convert to milliseconds
-        vocals_current_down = int(fade_start_time_current * 1000)
-        vocals_transition_in = int(fade_start_time_transition * 1000)  # CORRECTED
-        transition_start_time = int(fade_start_time_transition * 1000)  # entry point of Song B audio
-        transition_end_time_b = int(fade_end_time_transition * 1000)    # when B has fully entered
-        transition_start_other = vocals_current_down
+        down, vocals_in = samples(vocals_current_down), samples(vocals_transition_in)
+        crossfade, tease = samples(VOCALS_CROSSFADE_MS), samples(TEASE_DURATION_MS)
+        # Where song B picks up after the tease, on its own (unstretched) timeline
+        resume = samples(int((vocals_transition_in + TEASE_DURATION_MS) * ratio1))
 
-        matched_vocals_path, ratio1 = match_bpm(songs_dir, songs_dir + "/transition_song/vocals.wav")
-        tease_duration_ms = 10000
+        # PART 1 - 2.5: Song A instrumental until the instrumental switch
+        mix.add(instrumental_current, 0, 0, down + tease + crossfade, fade_out=crossfade)
 
-        vocals_b_matched = AudioSegment.from_file(matched_vocals_path)
-        crossfade_duration = 3000
-
-        # PART 1: Song A
-        part1 = vocals_current[:vocals_current_down-crossfade_duration]
-        part1 = part1.overlay(instrumental_current[:vocals_current_down-crossfade_duration])
-
-        # PART 1.5: Vocals Switch
-        part1_5 = vocals_current[vocals_current_down-crossfade_duration:vocals_current_down].fade_out(crossfade_duration)
-        part1_5 = part1_5.overlay(instrumental_current[vocals_current_down-crossfade_duration:vocals_current_down])
-        part1_5 = part1_5.overlay(vocals_b_matched[vocals_transition_in-crossfade_duration:vocals_transition_in].fade_in(crossfade_duration))
-        
-        # PART 2: Song A instrumental + Song B vocals
-        a_instr_tease = instrumental_current[vocals_current_down:vocals_current_down + tease_duration_ms]
-        b_vocals_tease = vocals_b_matched[vocals_transition_in:vocals_transition_in + tease_duration_ms]
-        part2 = a_instr_tease.overlay(b_vocals_tease)
+        # PART 1 - 1.5: Song A vocals, switching to song B's tempo-matched vocals
+        mix.add(vocals_current, 0, 0, down, fade_out=crossfade)
+        mix.add(vocals_b_matched, down - crossfade, vocals_in - crossfade, vocals_in + tease + crossfade, fade_in=crossfade)
 
-        # PART 2.5: Instrumental Switch
-        a_instr_tease = instrumental_current[vocals_current_down + tease_duration_ms:vocals_current_down + tease_duration_ms + crossfade_duration].fade_out(crossfade_duration)
-        b_vocals_tease = vocals_b_matched[vocals_transition_in + tease_duration_ms:vocals_transition_in + tease_duration_ms + crossfade_duration]
-        part2_5 = a_instr_tease.overlay(b_vocals_tease)
-        part2_5 = part2_5.overlay(instrumental_transition[int((vocals_transition_in+tease_duration_ms) * ratio1):int((vocals_transition_in+tease_duration_ms+crossfade_duration) * ratio1)].fade_in(crossfade_duration))
+        # PART 2.5 - 3: Song B instrumental comes in, then song B continues
+        mix.add(instrumental_transition, down + tease, resume, fade_in=crossfade)
+        mix.add(vocals_transition, down + tease + crossfade, resume + crossfade)
 
-        # PART 3: Song B continued
-        part3 = vocals_transition[int((vocals_transition_in+tease_duration_ms + crossfade_duration) * ratio1):]
-        part3 = part3.overlay(instrumental_transition[int((vocals_transition_in+tease_duration_ms+ crossfade_duration) * ratio1):])
-
-        final_transition = part1 + part1_5 + part2 + part2_5 + part3
-        output_file = songs_dir + "/dj_transition.mp3"
-
-        vticf = int((vocals_transition_in + tease_duration_ms + crossfade_duration) * ratio1)
+        vticf = int((vocals_transition_in + TEASE_DURATION_MS + VOCALS_CROSSFADE_MS) * ratio1)
         print(vticf)
     
     else:
         raise ValueError(f"Unsupported transition type: {transition_type}")
 
-    final_transition.export(output_file, format="mp3")
+    if DEBUG_AUDIO:
+        pcm_to_segment(to_pcm16(mix.mix()), rate).export(songs_dir + "/dj_transition.mp3", format="mp3")
     print(f"{transition_type.title()} DJ Transition created!")
 
-    return a_cut, b_cut, vticf
+    return a_cut, b_cut, vticf, mix
 
 
-def create_full_mix(uuid_folder, song_paths, output_file, transition_type="none"):
+def create_full_mix(uuid_folder, song_paths, output_file, transition_type="none", analyses=None):
     temp_root = os.path.join(uuid_folder, "temp_songs")
     assert len(song_paths) >= 2, "Need at least two songs for transitions."
 
-    final_mix = AudioSegment.silent(duration=0)
+    final_mix = None
     os.makedirs(temp_root, exist_ok=True)
 
     vticf = 0
 
+    # One analysis per song, shared by both pairs the song takes part in
+    analyses = dict(analyses or {})
+    with timed('analyze_song'):
+        for path in song_paths:
+            if path not in analyses:
+                analyses[path] = analyze_song(path)
+    choruses = {}
+
     for i in range(len(song_paths) - 1):
         song_a = song_paths[i]
         song_b = song_paths[i + 1]
+        report_progress(f'transition {i + 1}/{len(song_paths) - 1}', 0.4 + 0.55 * i / (len(song_paths) - 1))
         transition_dir = os.path.join(temp_root, f"transition_{i}_{uuid.uuid4().hex[:6]}")
         os.makedirs(transition_dir, exist_ok=True)
 
@@ -285,46 +172,56 @@ def create_full_mix(uuid_folder, song_paths, output_file, transition_type="none"
         os.makedirs(current_song_dir, exist_ok=True)
         os.makedirs(transition_song_dir, exist_ok=True)
 
-        # Extract chorus from A starting at the offset
-        chorus_a_path = os.path.join(current_song_dir, "chorus.mp3")
-        chorus_b_path = os.path.join(transition_song_dir, "chorus.mp3")
+        # Choruses stay in memory; song B's is reused as the next pair's song A
+        with timed('extract_chorus'):
+            for path in (song_a, song_b):
+                if path not in choruses:
+                    choruses[path] = extract_chorus(path, CHORUS_SECONDS, start_ms=analyses[path].chorus_start(CHORUS_SECONDS))
+        start_a, end_a, chorus_a, rate_a = choruses.pop(song_a)
+        start_b, end_b, chorus_b, rate_b = choruses[song_b]
 
-        # Extract full chorus
-        extract_chorus(song_a, chorus_a_path)
-        extract_chorus(song_b, chorus_b_path)
+        # Beat grids and BPM ratio decide the transition before any separation
+        beats_a = analyses[song_a].beats_between(start_a / rate_a, end_a / rate_a)
+        beats_b = analyses[song_b].beats_between(start_b / rate_b, end_b / rate_b)
+        ratio = get_stretch_ratio(transition_dir, analyses[song_a], analyses[song_b])
 
-        # Rename to song.mp3 for processing
-        chorus_a_renamed = os.path.join(current_song_dir, "song.mp3")
-        chorus_b_renamed = os.path.join(transition_song_dir, "song.mp3")
-        shutil.move(chorus_a_path, chorus_a_renamed)
-        shutil.move(chorus_b_path, chorus_b_renamed)
-
-        # Stem separation
-        split_audio(chorus_a_renamed, current_song_dir)
-        split_audio(chorus_b_renamed, transition_song_dir)
-
-        # Create transition
         if transition_type == "none":
-            matched_vocals_path, ratio = match_bpm(transition_dir, transition_dir + "/transition_song/vocals.wav")
             if 0.97 <= ratio <= 1.03:
-                a_cut, b_cut, new_vticf = create_transition(transition_dir, vticf, transition_type='vocals_crossover')
+                pair_transition_type = 'vocals_crossover'
             else:
-                a_cut, b_cut, new_vticf = create_transition(transition_dir, vticf, transition_type='crossfade')
+                pair_transition_type = 'crossfade'
         else:
-            a_cut, b_cut, new_vticf = create_transition(transition_dir, vticf, transition_type=transition_type)
+            pair_transition_type = transition_type
+
+        # Stem separation (both choruses in one model pass, only where stems are used)
+        plan = plan_transition(beats_a, beats_b, pair_transition_type, ratio, min_time=MIN_TIME_BEFORE_TRANSITION)
+        with timed('split_audio'):
+            stems_a, stems_b = split_audio_batch(
+                [(chorus_a, rate_a), (chorus_b, rate_b)],
+                [current_song_dir, transition_song_dir],
+                windows=stem_windows(plan, pair_transition_type)
+            )
+
+        with timed('create_transition'):
+            a_cut, b_cut, new_vticf, transition_mix = create_transition(
+                transition_dir, vticf, pair_transition_type, stems_a, stems_b, rate_a, rate_b,
+                beats_current=beats_a, beats_transition=beats_b, stretch_ratio=ratio
+            )
         
         vticf = new_vticf
 
-        # Load transition audio
-        transition_audio_path = os.path.join(transition_dir, "dj_transition.mp3")
-        transition_audio = AudioSegment.from_file(transition_audio_path)
-
-        transition_audio = transition_audio[b_cut:]
-        final_mix = final_mix[:-max(0, a_cut)]
-        final_mix += transition_audio
+        # Splice the float transition in: drop the end of the mix it replays,
+        # then append it from b_cut. Limiting/dither happen once, at export.
+        if final_mix is None:
+            final_mix = Mixer(transition_mix.rate, transition_mix.channels)
+        final_mix.truncate(final_mix.length - final_mix.samples(a_cut))
+        final_mix.append(final_mix.prepare(transition_mix.mix(), transition_mix.rate), start=final_mix.samples(b_cut))
 
         # Clean up
         shutil.rmtree(transition_dir)
 
-    final_mix.export(output_file, format="mp3")
+    with timed('mp3_export'):
+        pcm = final_mix.render()
+        pcm_to_segment(pcm, final_mix.rate).export(output_file, format="mp3")
+    inc('audio_seconds', len(pcm) / final_mix.rate, 'Seconds of audio processed', stage='playlist_render')
     print(f"✅ Final mix saved to {output_file}")
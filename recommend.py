@@ -0,0 +1,87 @@
+import numpy as np
+from scipy.spatial import cKDTree
+from scoring import (
+    KEY_PENALTY, MISSING_KEY, UNKNOWN_KEY, MIN_SCORE,
+    BPM_WEIGHT, LOUDNESS_WEIGHT, ENERGY_WEIGHT, encode_camelot
+)
+
+# The transition score is a Camelot penalty (0 or a constant) plus a weighted
+# sum of squared feature differences. Scaling each feature by sqrt(weight)
+# turns the second part into a squared Euclidean distance, so songs are
+# bucketed by key with a KD-tree per bucket: compatible buckets are searched
+# first, and incompatible ones only while the penalty can still beat the
+# current k-th best score. Results match a full scan for any k.
+FEATURE_SCALE = np.sqrt([BPM_WEIGHT, LOUDNESS_WEIGHT, ENERGY_WEIGHT])
+
+def _scaled(bpm, loudness, energy):
+    return np.column_stack([bpm, loudness, energy]) * FEATURE_SCALE
+
+class TransitionIndex:
+    def __init__(self, columns):
+        self.filenames = columns['filename']
+        points = _scaled(columns['bpm'], columns['loudness'], columns['energy'])
+        camelot = columns['camelot']
+        valid = ~np.isnan(points).any(axis=1) & (camelot != MISSING_KEY)
+
+        self.buckets = {}
+        for key in np.unique(camelot[valid]):
+            rows = np.flatnonzero(valid & (camelot == key))
+            self.buckets[int(key)] = (rows, cKDTree(points[rows]))
+
+    def _query_bucket(self, key, point, k, penalty, upper_bound=np.inf):
+        # k best (score, row) pairs in one bucket, skipping near-identical songs
+        rows, tree = self.buckets[key]
+        count = min(k, len(rows))
+        while True:
+            distances, positions = tree.query(point, k=count, distance_upper_bound=upper_bound)
+            distances, positions = np.atleast_1d(distances), np.atleast_1d(positions)
+            found = np.isfinite(distances)
+            distances, positions = distances[found], positions[found]
+            scores = penalty + distances ** 2
+            keep = scores >= MIN_SCORE
+            if keep.sum() >= k or count == len(rows) or len(positions) < count:
+                return scores[keep], rows[positions[keep]]
+            count = min(len(rows), count * 2)
+
+    def top_k(self, source, k=10):
+        if k <= 0 or not self.buckets:
+            return []
+
+        source_key = encode_camelot([source.get('camelot_key')])[0]
+        if source_key == MISSING_KEY:
+            source_key = UNKNOWN_KEY
+        try:
+            point = _scaled([float(source['bpm'])], [float(source['loudness'])], [float(source['energy'])])[0]
+        except (TypeError, ValueError):
+            return []
+        if np.isnan(point).any():
+            return []
+
+        penalties = KEY_PENALTY[source_key]
+        scores, rows = [], []
+
+        def merge(bucket_keys, upper_bound=np.inf):
+            for key in bucket_keys:
+                bucket_scores, bucket_rows = self._query_bucket(key, point, k, penalties[key], upper_bound)
+                scores.extend(bucket_scores)
+                rows.extend(bucket_rows)
+
+        merge([key for key in self.buckets if penalties[key] == 0])
+        best = self._best(scores, rows, k)
+
+        incompatible = [key for key in self.buckets if penalties[key] > 0]
+        if incompatible:
+            penalty = penalties[incompatible[0]]
+            kth_score = best[-1][1] if len(best) == k else np.inf
+            if kth_score > penalty:
+                # Only songs closer than sqrt(kth - penalty) can still make the cut
+                merge(incompatible, np.sqrt(kth_score - penalty) if np.isfinite(kth_score) else np.inf)
+                best = self._best(scores, rows, k)
+
+        return [(self.filenames[row], score) for row, score in best]
+
+    def _best(self, scores, rows, k):
+        # Lowest score first; ties go to the earlier catalog row like argmin
+        scores, rows = np.asarray(scores, dtype=np.float64), np.asarray(rows, dtype=np.int64)
+        order = np.lexsort((rows, scores))[:k]
+        return [(int(rows[i]), float(scores[i])) for i in order]
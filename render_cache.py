@@ -0,0 +1,74 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from transition import ENGINE_VERSION
+
+RENDER_CACHE_MAX_MB = int(os.environ.get('RENDER_CACHE_MAX_MB', '1024'))
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class RenderCache:
+    # Maps (current song content, transition song, transition type, engine
+    # version) to an already rendered output folder in temp/, so the same
+    # request against an unchanged catalog skips extraction, separation and
+    # mixing. Entries record the catalog version they were rendered under and
+    # are dropped once it changes. Past max_bytes of referenced outputs the
+    # least recently used entries are forgotten (the output store then ages
+    # their folders out as usual).
+
+    def __init__(self, root='temp', max_bytes=RENDER_CACHE_MAX_MB * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, current_digest, transition_song, transition_type):
+        return f"{current_digest}:{transition_song}:{transition_type}:{ENGINE_VERSION}"
+
+    def get(self, key, catalog_version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                folder = os.path.join(self.root, entry['folder'])
+                if entry['catalog_version'] == catalog_version and os.path.exists(os.path.join(folder, 'dj_transition.mp3')):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    # Counts as a use for the output store's eviction
+                    os.utime(folder)
+                    return entry
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, catalog_version, folder, **result):
+        path = os.path.join(self.root, folder)
+        size = sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+        with self._lock:
+            self._entries[key] = {'folder': folder, 'catalog_version': catalog_version, 'size': size, **result}
+            self._entries.move_to_end(key)
+            total = sum(entry['size'] for entry in self._entries.values())
+            while total > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                total -= evicted['size']
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': sum(entry['size'] for entry in self._entries.values()),
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+render_cache = RenderCache()
@@ -0,0 +1,110 @@
+import json
+import os
+import re
+import threading
+import time
+from search import make_safe_filename
+from library import SONG_EXTENSIONS, song_path
+
+RESOLVER_CACHE_PATH = os.environ.get('RESOLVER_CACHE_PATH', os.path.join('cache', 'resolver.json'))
+QUERY_TTL_SECONDS = int(os.environ.get('RESOLVER_QUERY_TTL', str(7 * 24 * 3600)))
+
+# Words that YouTube titles and user queries add or drop freely
+NOISE_WORDS = {
+    'official', 'audio', 'video', 'music', 'lyric', 'lyrics', 'hd', 'hq', '4k',
+    'visualizer', 'remastered', 'ft', 'feat', 'featuring', 'the', 'a', 'and', 'x'
+}
+
+def title_tokens(title):
+    # make_safe_filename first so queries and library names normalize the same way
+    words = re.findall(r'[a-z0-9]+', make_safe_filename(title).lower())
+    return frozenset(word for word in words if word not in NOISE_WORDS)
+
+class SongResolver:
+    # Resolves a search query to a song before touching yt-dlp:
+    #   query -> video id   (cached for query_ttl seconds, skips the search)
+    #   video id -> library file in songs/ (skips the download too)
+    # plus a fallback that matches the query's words against library file names.
+
+    def __init__(self, cache_path=RESOLVER_CACHE_PATH, library_dir='songs', query_ttl=QUERY_TTL_SECONDS):
+        self.cache_path = cache_path
+        self.library_dir = library_dir
+        self.query_ttl = query_ttl
+        self.counts = {'library_hits': 0, 'query_hits': 0, 'misses': 0}
+        self._lock = threading.Lock()
+        self._library_mtime = None
+        self._library_index = {}
+        self.queries, self.videos = self._load()
+
+    def _load(self):
+        try:
+            with open(self.cache_path, encoding='utf-8') as f:
+                data = json.load(f)
+            return data.get('queries', {}), data.get('videos', {})
+        except (FileNotFoundError, ValueError):
+            return {}, {}
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.cache_path) or '.', exist_ok=True)
+        tmp_path = f"{self.cache_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'queries': self.queries, 'videos': self.videos}, f)
+        os.replace(tmp_path, self.cache_path)
+
+    def library_path(self, filename):
+        return song_path(filename, self.library_dir)
+
+    def _match_library_name(self, query):
+        # Re-index only when songs/ changed
+        try:
+            mtime = os.stat(self.library_dir).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        if mtime != self._library_mtime:
+            index = {}
+            for name in os.listdir(self.library_dir):
+                stem, ext = os.path.splitext(name)
+                if ext in SONG_EXTENSIONS:
+                    index.setdefault(title_tokens(stem), stem)
+            self._library_index, self._library_mtime = index, mtime
+        tokens = title_tokens(query)
+        return self._library_index.get(tokens) if tokens else None
+
+    def resolve(self, query):
+        # Returns (video_id, title, library_filename); any part may be None
+        key = ' '.join(sorted(title_tokens(query))) or query.strip().lower()
+        with self._lock:
+            entry = self.queries.get(key)
+            if entry and time.time() - entry['resolved_at'] > self.query_ttl:
+                entry = None
+
+            if entry:
+                video = self.videos.get(entry['video_id'], {})
+                filename = video.get('filename')
+                if filename and self.library_path(filename):
+                    self.counts['library_hits'] += 1
+                    return entry['video_id'], entry['title'], filename
+                self.counts['query_hits'] += 1
+                return entry['video_id'], entry['title'], None
+
+            filename = self._match_library_name(query)
+            if filename:
+                self.counts['library_hits'] += 1
+                return None, filename, filename
+
+            self.counts['misses'] += 1
+            return None, None, None
+
+    def record(self, query, video_id, title, filename):
+        key = ' '.join(sorted(title_tokens(query))) or query.strip().lower()
+        with self._lock:
+            self.queries[key] = {'video_id': video_id, 'title': title, 'resolved_at': time.time()}
+            self.videos[video_id] = {'filename': filename, 'title': title}
+            self._save()
+
+    def stats(self):
+        lookups = sum(self.counts.values())
+        return {
+            **self.counts,
+            'hit_rate': (self.counts['library_hits'] + self.counts['query_hits']) / lookups if lookups else 0.0,
+        }
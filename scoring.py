@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+
+# Camelot keys are encoded as integers 0-23 (1A..12A, 1B..12B). Anything that
+# doesn't parse maps to UNKNOWN_KEY, and missing keys to MISSING_KEY so those
+# rows can be filtered out like NaN features.
+CAMELOT_KEYS = [f"{num}{letter}" for letter in 'AB' for num in range(1, 13)]
+CAMELOT_INDEX = {key: i for i, key in enumerate(CAMELOT_KEYS)}
+UNKNOWN_KEY = len(CAMELOT_KEYS)
+MISSING_KEY = -1
+
+CAMELOT_PENALTY = 10
+CAMELOT_WEIGHT = 10
+BPM_WEIGHT = 5
+LOUDNESS_WEIGHT = 10
+ENERGY_WEIGHT = 200
+MIN_SCORE = 0.01
+
+def _build_key_penalty():
+    # KEY_PENALTY[source, target] is the weighted Camelot term of the score:
+    # 0 for the same key, +/-1 on the wheel or the relative major/minor
+    size = len(CAMELOT_KEYS) + 1
+    table = np.full((size, size), CAMELOT_PENALTY**2 * CAMELOT_WEIGHT, dtype=np.float64)
+    for source, key in enumerate(CAMELOT_KEYS):
+        num, letter = int(key[:-1]), key[-1]
+        other_letter = 'B' if letter == 'A' else 'A'
+        compatible = [f"{(num - 2) % 12 + 1}{letter}", key, f"{num % 12 + 1}{letter}", f"{num}{other_letter}"]
+        for target in compatible:
+            table[source, CAMELOT_INDEX[target]] = 0
+    return table
+
+KEY_PENALTY = _build_key_penalty()
+
+def encode_camelot(keys):
+    keys = pd.Series(list(keys), dtype=object)
+    encoded = keys.map(CAMELOT_INDEX).fillna(UNKNOWN_KEY)
+    encoded[keys.isna()] = MISSING_KEY
+    return encoded.to_numpy(dtype=np.int64)
+
+def columns_from_frame(df: pd.DataFrame) -> dict:
+    return {
+        'filename': df['filename'].to_numpy(),
+        'bpm': pd.to_numeric(df['bpm'], errors='coerce').to_numpy(dtype=np.float64),
+        'loudness': pd.to_numeric(df['loudness'], errors='coerce').to_numpy(dtype=np.float64),
+        'energy': pd.to_numeric(df['energy'], errors='coerce').to_numpy(dtype=np.float64),
+        'camelot': encode_camelot(df['camelot_key']),
+    }
+
+def transition_scores(source: dict, columns: dict) -> np.ndarray:
+    # Weighted transition score from `source` to every row of `columns`.
+    # Rows with missing features score NaN.
+    source_key = encode_camelot([source.get('camelot_key')])[0]
+    if source_key == MISSING_KEY:
+        source_key = UNKNOWN_KEY
+
+    camelot = columns['camelot']
+    scores = KEY_PENALTY[source_key, np.where(camelot == MISSING_KEY, UNKNOWN_KEY, camelot)]
+    scores = scores + BPM_WEIGHT * (columns['bpm'] - float(source['bpm']))**2
+    scores += LOUDNESS_WEIGHT * (columns['loudness'] - float(source['loudness']))**2
+    scores += ENERGY_WEIGHT * (columns['energy'] - float(source['energy']))**2
+    scores[camelot == MISSING_KEY] = np.nan
+    return scores
+
+def best_transition_index(source: dict, columns: dict) -> int:
+    if len(columns['filename']) == 0:
+        raise ValueError("No transition candidates available.")
+
+    scores = transition_scores(source, columns)
+    valid = ~np.isnan(scores)
+    if not valid.any():
+        raise ValueError("No valid candidates after filtering.")
+
+    # Scores under MIN_SCORE are near-identical songs, usually the song itself
+    scores = np.where(valid & (scores >= MIN_SCORE), scores, np.inf)
+    if np.isinf(scores).all():
+        raise ValueError("No transition candidates scored above threshold.")
+
+    return int(np.argmin(scores))
+
+def transition_cost_matrix(columns: dict) -> np.ndarray:
+    # cost[i, j] is the score of going from song i to song j, for all pairs in
+    # one broadcast. Songs with missing features get infinite cost both ways.
+    camelot = np.where(columns['camelot'] == MISSING_KEY, UNKNOWN_KEY, columns['camelot'])
+    cost = KEY_PENALTY[camelot[:, None], camelot[None, :]].copy()
+    for name, weight in (('bpm', BPM_WEIGHT), ('loudness', LOUDNESS_WEIGHT), ('energy', ENERGY_WEIGHT)):
+        values = columns[name]
+        cost += weight * (values[:, None] - values[None, :])**2
+
+    invalid = np.isnan(cost.diagonal()) | (columns['camelot'] == MISSING_KEY)
+    cost[invalid, :] = np.inf
+    cost[:, invalid] = np.inf
+    np.fill_diagonal(cost, np.inf)
+    return cost
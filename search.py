@@ -1,7 +1,14 @@
 import yt_dlp
 import os
+import re
+import unicodedata
+from library import NATIVE_CODEC, find_song_file
 
-def search_and_download_youtube_song(query, output_dir, cookie_path):
+def make_safe_filename(name: str) -> str:
+    name = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'[\\/:"*?<>|]', '_', name)
+
+def search_youtube(query):
     search_opts = {
         'quiet': True,
         'skip_download': True,
@@ -13,36 +20,58 @@ def search_and_download_youtube_song(query, output_dir, cookie_path):
         info = ydl.extract_info(search_query, download=False)
         if not info or not info.get('entries'):
             print(f"No results found for query: {query}")
-            return
+            return None, None
         first_result = info['entries'][0]
 
-    youtube_url = f"https://www.youtube.com/watch?v={first_result.get('id')}"
-    song_title = first_result.get('title', 'Unknown Title')
+    return first_result.get('id'), first_result.get('title', 'Unknown Title')
+
+def download_postprocessors():
+    # With NATIVE_CODEC the audio stream is kept as served and the thumbnail
+    # stays a separate song.jpg, since webm can't embed one
+    if NATIVE_CODEC:
+        return [
+            {
+                'key': 'FFmpegThumbnailsConvertor',
+                'format': 'jpg',
+            },
+        ]
+    return [
+        {
+            'key': 'FFmpegExtractAudio',
+            'preferredcodec': 'mp3',
+            'preferredquality': '192',
+        },
+        {
+            'key': 'FFmpegThumbnailsConvertor',
+            'format': 'jpg',
+        },
+        {
+            'key': 'EmbedThumbnail',
+        },
+    ]
+
+def download_youtube_song(video_id, output_dir, cookie_path):
+    youtube_url = f"https://www.youtube.com/watch?v={video_id}"
 
     download_opts = {
         'cookiefile': cookie_path,
         'format': 'bestaudio/best',
         'outtmpl': f'{output_dir}/song.%(ext)s',
         'writethumbnail': True,
-        'postprocessors': [
-            {
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
-                'preferredquality': '192',
-            },
-            {
-                'key': 'FFmpegThumbnailsConvertor',
-                'format': 'jpg',
-            },
-            {
-                'key': 'EmbedThumbnail',
-            },
-        ],
+        'postprocessors': download_postprocessors(),
         'prefer_ffmpeg': True,
         'quiet': False,
     }
 
     with yt_dlp.YoutubeDL(download_opts) as ydl:
         ydl.download([youtube_url])
-    
-    return song_title
\ No newline at end of file
+
+    return find_song_file(output_dir)
+
+def search_and_download_youtube_song(query, output_dir, cookie_path):
+    video_id, song_title = search_youtube(query)
+    if video_id is None:
+        return
+
+    download_youtube_song(video_id, output_dir, cookie_path)
+    return song_title
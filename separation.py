@@ -0,0 +1,56 @@
+import torch
+from models import DEFAULT_MODEL, STEM_NAMES
+from stem_cache import separate_cached
+from metrics import inc
+
+# Extra audio separated on each side of a window so demucs edge effects
+# fall outside the part that is actually kept
+STEM_WINDOW_MARGIN_MS = 2000
+
+def merge_windows(windows, length_ms):
+    merged = []
+    for start_ms, end_ms in sorted(windows):
+        start_ms = max(0, int(start_ms))
+        end_ms = min(length_ms, int(end_ms))
+        if end_ms <= start_ms:
+            continue
+        if merged and start_ms <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end_ms)
+        else:
+            merged.append([start_ms, end_ms])
+    return merged
+
+def separate_windows(clips, rates, windows_list, name=DEFAULT_MODEL):
+    # windows_list holds, per clip, the (start_ms, end_ms) ranges whose stems
+    # are needed, or None to separate the whole clip. Only those ranges (plus
+    # a margin) go through the model. Outside them the original mix is passed
+    # through untouched in the 'other' stem with the rest silent, so the stems
+    # still sum to the input everywhere.
+    pieces, piece_rates, owners = [], [], []
+    for index, (clip, rate, windows) in enumerate(zip(clips, rates, windows_list)):
+        length = clip.shape[-1]
+        length_ms = length * 1000 // rate
+        if windows is None:
+            windows = [(0, length_ms)]
+
+        for start_ms, end_ms in merge_windows(windows, length_ms):
+            keep_start = start_ms * rate // 1000
+            keep_end = length if end_ms >= length_ms else end_ms * rate // 1000
+            piece_start = max(0, (start_ms - STEM_WINDOW_MARGIN_MS) * rate // 1000)
+            piece_end = min(length, (end_ms + STEM_WINDOW_MARGIN_MS) * rate // 1000)
+            pieces.append(clip[:, piece_start:piece_end])
+            piece_rates.append(rate)
+            owners.append((index, keep_start, keep_end, piece_start))
+
+    results = []
+    for clip in clips:
+        sources = torch.zeros((len(STEM_NAMES),) + tuple(clip.shape), dtype=clip.dtype)
+        sources[STEM_NAMES.index('other')] = clip
+        results.append(sources)
+
+    inc('audio_seconds', sum(piece.shape[-1] / rate for piece, rate in zip(pieces, piece_rates)), 'Seconds of audio processed', stage='separation')
+    separated = separate_cached(pieces, piece_rates, name) if pieces else []
+    for (index, keep_start, keep_end, piece_start), piece_sources in zip(owners, separated):
+        results[index][:, :, keep_start:keep_end] = piece_sources[:, :, keep_start - piece_start:keep_end - piece_start]
+
+    return results
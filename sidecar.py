@@ -0,0 +1,73 @@
+import os
+import numpy as np
+from analyze import AnalysisResult, analyze_song
+
+# Beat grid, downbeats, onset envelope and chorus windows for a library song,
+# stored as songs/<name>.npz so requests never re-run rhythm extraction
+CHORUS_DURATIONS = (30, 60)
+
+def sidecar_path(song_path):
+    return os.path.splitext(song_path)[0] + '.npz'
+
+def save_sidecar(song_path, analysis):
+    chorus = {
+        f'chorus_{duration}': np.array([start, start + duration * 1000], dtype=np.int64)
+        for duration in CHORUS_DURATIONS
+        if (start := analysis.chorus_start(duration)) is not None
+    }
+    path = sidecar_path(song_path)
+    tmp_path = path + '.tmp.npz'
+    np.savez_compressed(
+        tmp_path,
+        bpm=np.float64(analysis.bpm),
+        beats=np.asarray(analysis.beats, dtype=np.float32),
+        downbeats=np.asarray(analysis.downbeats, dtype=np.float32),
+        onset_env=np.asarray(analysis.onset_env, dtype=np.float32),
+        key=np.str_(analysis.key),
+        scale=np.str_(analysis.scale),
+        camelot=np.str_(analysis.camelot),
+        loudness=np.float64(analysis.loudness),
+        energy=np.float64(analysis.energy),
+        duration=np.float64(analysis.duration),
+        tier=np.str_(analysis.tier),
+        **chorus
+    )
+    os.replace(tmp_path, path)
+
+def load_sidecar(song_path):
+    try:
+        with np.load(sidecar_path(song_path)) as data:
+            return AnalysisResult(
+                bpm=float(data['bpm']),
+                beats=data['beats'],
+                key=str(data['key']),
+                scale=str(data['scale']),
+                camelot=str(data['camelot']),
+                loudness=float(data['loudness']),
+                energy=float(data['energy']),
+                duration=float(data['duration']),
+                tier=str(data['tier']) if 'tier' in data else 'full',
+                downbeats=data['downbeats'],
+                onset_env=data['onset_env'],
+                chorus_windows={
+                    duration: tuple(int(t) for t in data[f'chorus_{duration}'])
+                    for duration in CHORUS_DURATIONS
+                    if f'chorus_{duration}' in data
+                }
+            )
+    except (FileNotFoundError, KeyError, ValueError, OSError):
+        return None
+
+def library_analysis(song_path):
+    # Sidecar if present, otherwise analyze once and backfill it
+    analysis = load_sidecar(song_path)
+    if analysis is None:
+        analysis = analyze_song(song_path)
+        save_sidecar(song_path, analysis)
+    return analysis
+
+def remove_sidecar(song_path):
+    try:
+        os.remove(sidecar_path(song_path))
+    except FileNotFoundError:
+        pass
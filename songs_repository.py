@@ -0,0 +1,164 @@
+import os
+import sqlite3
+import threading
+from urllib.parse import quote
+from supabase import create_client
+
+# Data access for the songs table. Bulk calls are chunked so thousands of
+# rows take a handful of round-trips, listing uses keyset pagination on
+# filename (stable under concurrent inserts, no OFFSET scans, and not capped
+# by PostgREST's default 1000-row response), and callers can ask for only the
+# columns they need.
+#
+# SONGS_BACKEND=sqlite swaps Supabase for a local SQLite file
+# (SONGS_SQLITE_PATH), for local runs and tests without a Supabase project.
+# Both are read when the repository is created, after load_dotenv.
+SONG_FIELDS = ('filename', 'bpm', 'camelot_key', 'loudness', 'energy')
+BULK_CHUNK_SIZE = 500
+# Deletes filter with ?filename=in.(...) in the URL; chunks stay well under
+# the 8-16 KB request-line limits of common gateways
+DELETE_URL_BUDGET = 6000
+PAGE_SIZE = 1000
+
+def _check_fields(fields):
+    fields = tuple(fields or SONG_FIELDS)
+    unknown = [field for field in fields if field not in SONG_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown song fields: {', '.join(unknown)}")
+    return fields
+
+def _song_row(row):
+    # Known columns only; columns a row leaves out keep their stored value
+    return {field: row[field] for field in SONG_FIELDS if field in row}
+
+def _chunks(items, size=BULK_CHUNK_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def _unique_rows(rows):
+    # One row per filename, the last one winning as it did row by row.
+    # Postgres rejects an upsert that touches the same row twice.
+    unique = {}
+    for row in map(_song_row, rows):
+        unique.pop(row['filename'], None)
+        unique[row['filename']] = row
+    return list(unique.values())
+
+def _url_chunks(filenames, budget=DELETE_URL_BUDGET, size=BULK_CHUNK_SIZE):
+    # Chunks whose percent-encoded, quoted filter fits in budget bytes
+    chunk, length = [], 0
+    for filename in filenames:
+        encoded = len(quote(f'"{filename}",', safe=''))
+        if chunk and (length + encoded > budget or len(chunk) >= size):
+            yield chunk
+            chunk, length = [], 0
+        chunk.append(filename)
+        length += encoded
+    if chunk:
+        yield chunk
+
+class SongsRepository:
+    # Backends implement upsert, delete and page; listing builds on page
+
+    def iter_all(self, fields=None, page_size=PAGE_SIZE):
+        after = None
+        while True:
+            rows, after = self.page(after=after, limit=page_size, fields=fields)
+            yield from rows
+            if after is None:
+                return
+
+    def all(self, fields=None):
+        return list(self.iter_all(fields))
+
+class SupabaseSongsRepository(SongsRepository):
+    def __init__(self, client, table='songs'):
+        self.client = client
+        self.table = table
+
+    def upsert(self, rows):
+        count = 0
+        for chunk in _chunks(_unique_rows(rows)):
+            self.client.table(self.table).upsert(chunk, on_conflict="filename").execute()
+            count += len(chunk)
+        return count
+
+    def delete(self, filenames):
+        # Returns the filenames that were actually deleted
+        deleted = []
+        for chunk in _url_chunks(filenames):
+            response = self.client.table(self.table).delete().in_('filename', chunk).execute()
+            deleted.extend(row['filename'] for row in response.data or [])
+        return deleted
+
+    def page(self, after=None, limit=PAGE_SIZE, fields=None):
+        # (rows, cursor for the next page or None)
+        fields = _check_fields(fields)
+        columns = fields if 'filename' in fields else ('filename',) + fields
+        query = self.client.table(self.table).select(','.join(columns)).order('filename').limit(limit)
+        if after is not None:
+            query = query.gt('filename', after)
+        rows = query.execute().data or []
+        cursor = rows[-1]['filename'] if len(rows) == limit else None
+        return [{field: row.get(field) for field in fields} for row in rows], cursor
+
+class SQLiteSongsRepository(SongsRepository):
+    def __init__(self, path='songs.db'):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS songs ("
+                "filename TEXT PRIMARY KEY, bpm REAL, camelot_key TEXT, loudness REAL, energy REAL)"
+            )
+
+    def upsert(self, rows):
+        # One executemany per distinct column set, all in one transaction
+        groups = {}
+        for row in _unique_rows(rows):
+            groups.setdefault(tuple(row), []).append(tuple(row.values()))
+        with self._lock, self._conn:
+            for columns, values in groups.items():
+                updates = ', '.join(f"{field} = excluded.{field}" for field in columns if field != 'filename')
+                conflict = f"DO UPDATE SET {updates}" if updates else "DO NOTHING"
+                self._conn.executemany(
+                    f"INSERT INTO songs ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+                    f"ON CONFLICT(filename) {conflict}",
+                    values
+                )
+        return sum(len(values) for values in groups.values())
+
+    def delete(self, filenames):
+        deleted = []
+        with self._lock, self._conn:
+            for chunk in _chunks(filenames):
+                placeholders = ', '.join('?' * len(chunk))
+                found = self._conn.execute(f"SELECT filename FROM songs WHERE filename IN ({placeholders})", chunk)
+                deleted.extend(row[0] for row in found)
+                self._conn.execute(f"DELETE FROM songs WHERE filename IN ({placeholders})", chunk)
+        return deleted
+
+    def page(self, after=None, limit=PAGE_SIZE, fields=None):
+        fields = _check_fields(fields)
+        columns = fields if 'filename' in fields else ('filename',) + fields
+        sql = f"SELECT {', '.join(columns)} FROM songs"
+        params = []
+        if after is not None:
+            sql += " WHERE filename > ?"
+            params.append(after)
+        sql += " ORDER BY filename LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = [dict(zip(columns, values)) for values in self._conn.execute(sql, params)]
+        cursor = rows[-1]['filename'] if len(rows) == limit else None
+        return [{field: row[field] for field in fields} for row in rows], cursor
+
+def create_repository(backend=None):
+    backend = backend or os.environ.get('SONGS_BACKEND', 'supabase')
+    if backend == 'sqlite':
+        return SQLiteSongsRepository(os.environ.get('SONGS_SQLITE_PATH', 'songs.db'))
+    if backend != 'supabase':
+        raise ValueError(f"Unsupported songs backend: {backend}")
+    return SupabaseSongsRepository(create_client(os.environ.get('SUPABASE_URL'), os.environ.get('SUPABASE_KEY')))
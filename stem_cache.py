@@ -0,0 +1,100 @@
+import hashlib
+import os
+import threading
+import numpy as np
+import torch
+from models import DEFAULT_MODEL, separate_batch
+
+STEM_CACHE_DIR = os.environ.get('STEM_CACHE_DIR', os.path.join('cache', 'stems'))
+STEM_CACHE_MAX_MB = int(os.environ.get('STEM_CACHE_MAX_MB', '4096'))
+
+class StemCache:
+    # Content-addressed stems on disk. Entries are keyed by a hash of the
+    # decoded audio plus the model name, and evicted least-recently-used
+    # first (hits bump the file mtime) once the directory exceeds max_bytes.
+
+    def __init__(self, root=STEM_CACHE_DIR, max_bytes=STEM_CACHE_MAX_MB * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def key(self, wav, rate, model_name):
+        digest = hashlib.sha256()
+        digest.update(model_name.encode('utf-8'))
+        digest.update(str(rate).encode('utf-8'))
+        digest.update(str(tuple(wav.shape)).encode('utf-8'))
+        digest.update(np.ascontiguousarray(wav.numpy(), dtype=np.float32).tobytes())
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.root, f"{key}.npy")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            sources = np.load(path)
+            os.utime(path)
+        except (FileNotFoundError, ValueError, OSError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return torch.from_numpy(sources)
+
+    def put(self, key, sources):
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, sources.cpu().numpy().astype(np.float32))
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.root):
+                if not name.endswith('.npy'):
+                    continue
+                path = os.path.join(self.root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+stem_cache = StemCache()
+
+def separate_cached(clips, rates, name=DEFAULT_MODEL):
+    # Same contract as separate_batch, but clips already in the cache skip
+    # inference and only the misses are sent through the model together
+    keys = [stem_cache.key(clip, rate, name) for clip, rate in zip(clips, rates)]
+    results = [stem_cache.get(key) for key in keys]
+
+    missing = [i for i, sources in enumerate(results) if sources is None]
+    if missing:
+        separated = separate_batch([clips[i] for i in missing], name)
+        for i, sources in zip(missing, separated):
+            stem_cache.put(keys[i], sources)
+            results[i] = sources
+
+    return results
@@ -0,0 +1,75 @@
+import os
+import threading
+import lameenc
+import numpy as np
+
+# STREAM_RENDER=1 encodes a transition part by part into its final MP3 so
+# /api/stream_song can start serving it while the rest is still rendering.
+STREAM_RENDER = os.environ.get('STREAM_RENDER', '1') == '1'
+STREAM_BITRATE = 192
+
+_active = {}
+_active_lock = threading.Lock()
+
+def is_rendering(path):
+    with _active_lock:
+        return os.path.abspath(path) in _active
+
+def reserve(path):
+    # Creates path empty and marks it as rendering ahead of the writer, so its
+    # folder can be published and followed before the render starts
+    path = os.path.abspath(path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'wb').close()
+    with _active_lock:
+        _active[path] = None
+
+def discard(path):
+    # Drops a failed render: no longer rendering, and the partial file is gone
+    path = os.path.abspath(path)
+    with _active_lock:
+        _active.pop(path, None)
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+class StreamingMp3Writer:
+    # One LAME encoder for the whole file, so parts join without the gaps
+    # separate MP3 exports would leave. Every write is flushed to disk for
+    # readers tailing the file.
+
+    def __init__(self, path, rate=44100, channels=2):
+        self.path = os.path.abspath(path)
+        self.rate = rate
+        self.channels = channels
+        self.written_ms = 0
+        self._encoder = lameenc.Encoder()
+        self._encoder.set_bit_rate(STREAM_BITRATE)
+        self._encoder.set_in_sample_rate(rate)
+        self._encoder.set_channels(channels)
+        self._encoder.set_quality(2)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._file = open(self.path, 'wb')
+        with _active_lock:
+            _active[self.path] = self
+
+    def write(self, pcm):
+        # pcm: int16 (samples, channels) at the writer's rate and channels
+        if len(pcm) == 0:
+            return
+        self._file.write(self._encoder.encode(np.ascontiguousarray(pcm).tobytes()))
+        self._file.flush()
+        self.written_ms += len(pcm) * 1000 // self.rate
+
+    def close(self):
+        try:
+            self._file.write(self._encoder.flush())
+        finally:
+            self._file.close()
+            with _active_lock:
+                _active.pop(self.path, None)
+
+    def abort(self):
+        self._file.close()
+        discard(self.path)
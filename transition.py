@@ -1,9 +1,6 @@
-from pydub import AudioSegment
 import librosa
 import numpy as np
 import os
-from demucs.pretrained import get_model
-from demucs.apply import apply_model
 import torch
 import torchaudio
 import soundfile as sf
@@ -13,240 +10,291 @@ import numpy as np
 import os
 import soundfile as sf
 import pyrubberband as pyrb
-
-def extract_chorus(input_file, output_path, duration=30):
-    audio = AudioSegment.from_mp3(input_file)
-    samples = np.array(audio.get_array_of_samples()).astype(np.float32)
-
-    if audio.channels == 2:
-        samples = samples.reshape((-1, 2))
-        samples = samples.mean(axis=1)
-
-    sr = audio.frame_rate
-    onset_env = librosa.onset.onset_strength(y=samples, sr=sr)
-    hop_length = 512
-    frames_per_sec = sr / hop_length
-    window_length = int(duration * frames_per_sec)
-    energy = np.convolve(onset_env, np.ones(window_length), 'valid')
-    max_pos = np.argmax(energy)
-    start_time_sec = max_pos * hop_length / sr
-    start_ms = int(start_time_sec * 1000)
-    end_ms = start_ms + int(duration * 1000)
-    chorus = audio[start_ms:end_ms]
-    chorus.export(output_path, format="mp3")
-
-def split_audio(input_file, output_dir):
-    model = get_model('htdemucs')
-    wav, rate = torchaudio.load(input_file)
-    device = 'mps' if torch.mps.is_available() else 'cuda' if torch.cuda.is_available() else 'cpu'
-    sources = apply_model(model, wav.unsqueeze(0), device=device)
-    os.makedirs(output_dir, exist_ok=True)
-    for stem, name in zip(sources[0], ['drums', 'bass', 'other', 'vocals']):
-        output_path = os.path.join(output_dir, f"{name}.wav")
-        torchaudio.save(output_path, stem, rate)
-        print(f"Saved {name} to {output_path}")
+from models import STEM_NAMES
+from analyze import analyze_song, find_chorus_start, HOP_LENGTH
+from separation import separate_windows
+from library import find_song_file
+from metrics import timed, inc
+from audio_io import DEBUG_AUDIO, load_array, pcm_to_segment, array_to_mono
+from mixer import Mixer, ms_to_samples
+
+def extract_chorus(input_file, duration=30, start_ms=None):
+    # Returns (start_sample, end_sample, chorus, rate) with the chorus kept as
+    # a (channels, samples) tensor, ready for separation without an encode
+    wav, rate = load_array(input_file)
+    wav = torch.from_numpy(wav)
+
+    # start_ms comes from the song's analysis/sidecar when available
+    if start_ms is None:
+        samples = wav.mean(dim=0).numpy()
+        onset_env = librosa.onset.onset_strength(y=samples, sr=rate, hop_length=HOP_LENGTH)
+        start_ms = find_chorus_start(onset_env, duration, sr=rate)
+
+    start_sample = min(start_ms * rate // 1000, wav.shape[-1])
+    end_sample = min(start_sample + int(duration * rate), wav.shape[-1])
+    return start_sample, end_sample, wav[:, start_sample:end_sample], rate
+
+def split_audio(audio, output_dir=None):
+    return split_audio_batch([audio], [output_dir])[0]
+
+def split_audio_batch(inputs, output_dirs=None, windows=None):
+    # Each input is either a file path or an in-memory (wav, rate) pair such as
+    # the chorus from extract_chorus. Returns one {stem name: array} dict per
+    # input, each a (samples, channels) float32 view of the separated tensor
+    # at the input's rate. Stems stay in memory and are only written out as
+    # WAVs when DEBUG_AUDIO is set. windows optionally limits separation per
+    # input (see stem_windows).
+    clips, rates = [], []
+    for audio in inputs:
+        if isinstance(audio, str):
+            wav, rate = load_array(audio)
+            wav = torch.from_numpy(wav)
+        else:
+            wav, rate = audio
+        clips.append(wav)
+        rates.append(rate)
+
+    output_dirs = output_dirs or [None] * len(inputs)
+    windows = windows or [None] * len(inputs)
+    results = []
+    for sources, rate, output_dir in zip(separate_windows(clips, rates, windows), rates, output_dirs):
+        stems = {}
+        for stem, name in zip(sources, STEM_NAMES):
+            stems[name] = stem.numpy().T
+            if DEBUG_AUDIO and output_dir:
+                os.makedirs(output_dir, exist_ok=True)
+                output_path = os.path.join(output_dir, f"{name}.wav")
+                torchaudio.save(output_path, stem, rate)
+                print(f"Saved {name} to {output_path}")
+        results.append(stems)
+
+    return results
+
+def load_stems(stems_dir):
+    # ({stem name: (samples, channels) array}, rate) from the debug WAVs
+    stems, rate = {}, None
+    for name in STEM_NAMES:
+        stems[name], rate = sf.read(os.path.join(stems_dir, f"{name}.wav"), dtype='float32', always_2d=True)
+    return stems, rate
 
 def build_instrumental(bass, drums, other):
-    return bass.overlay(drums).overlay(other)
-
-def get_beat_times_essentia(audio_path):
-    loader = es.MonoLoader(filename=audio_path)
-    audio = loader()
+    instrumental = np.add(bass, drums)
+    instrumental += other
+    return instrumental
 
+def get_beat_times_essentia(audio):
     rhythm_extractor = es.RhythmExtractor2013(method="multifeature")
     _, beats, _, _, _ = rhythm_extractor(audio)
 
     return beats
 
-def get_bpm_essentia(audio, sr):
-    rhythm_extractor = es.RhythmExtractor2013(method="multifeature")
-    bpm, _, _, _, _ = rhythm_extractor(audio)
-    return bpm
-
-def match_bpm(songs_dir, target_path):
-    # Create two independent loader instances
-    loader1 = es.MonoLoader(filename=os.path.join(songs_dir, "current_song/song.mp3"))
-    source_audio = loader1()
-
-    # It's important NOT to reuse loader1 here
-    loader2 = es.MonoLoader(filename=os.path.join(songs_dir, "transition_song/song.mp3"))
-    target_audio = loader2()
-
-    sr = 44100
-    source_bpm = get_bpm_essentia(source_audio, sr)
-    target_bpm = get_bpm_essentia(target_audio, sr)
-
-    stretch_ratio = source_bpm / target_bpm
-
-    # Load stereo audio using soundfile for processing
-    y, stem_sr = sf.read(target_path)
-    y_stretched = pyrb.time_stretch(y, stem_sr, stretch_ratio)
-    y_stretched /= np.max(np.abs(y_stretched))
-
-    stem_path = os.path.splitext(target_path)[0] + "_matched.wav"
-    sf.write(stem_path, y_stretched, stem_sr)
-
-    print(f"CURRENT BPM: {source_bpm:.2f}")
-    print(f"TRANSITION BPM: {target_bpm:.2f}")
-
-    return stem_path, stretch_ratio
-
-def create_transition(songs_dir, transition_type="crossfade"):
-    # Load stems for current song
-    vocals_current = AudioSegment.from_file(songs_dir + "/current_song" + "/vocals.wav")
-    bass_current   = AudioSegment.from_file(songs_dir + "/current_song" + "/bass.wav")
-    drums_current  = AudioSegment.from_file(songs_dir + "/current_song" + "/drums.wav")
-    other_current  = AudioSegment.from_file(songs_dir + "/current_song" + "/other.wav")
-
-    # Load stems for transition song
-    vocals_transition = AudioSegment.from_file(songs_dir + "/transition_song" + "/vocals.wav")
-    bass_transition   = AudioSegment.from_file(songs_dir + "/transition_song" + "/bass.wav")
-    drums_transition  = AudioSegment.from_file(songs_dir + "/transition_song" + "/drums.wav")
-    other_transition  = AudioSegment.from_file(songs_dir + "/transition_song" + "/other.wav")
+def get_stretch_ratio(songs_dir, analysis_current=None, analysis_transition=None):
+    # Full-song BPMs come from the shared analysis; only decode as a fallback
+    if analysis_current is None:
+        analysis_current = analyze_song(find_song_file(os.path.join(songs_dir, "current_song")))
+    if analysis_transition is None:
+        analysis_transition = analyze_song(find_song_file(os.path.join(songs_dir, "transition_song")))
+
+    print(f"CURRENT BPM: {analysis_current.bpm:.2f}")
+    print(f"TRANSITION BPM: {analysis_transition.bpm:.2f}")
+
+    return analysis_current.bpm / analysis_transition.bpm
+
+def match_bpm(songs_dir, target, rate, stretch_ratio=None):
+    if stretch_ratio is None:
+        stretch_ratio = get_stretch_ratio(songs_dir)
+
+    # Time-stretch the (samples, channels) stem in memory
+    matched = pyrb.time_stretch(target, rate, stretch_ratio).astype(np.float32, copy=False)
+    matched /= np.max(np.abs(matched))
+
+    return matched, stretch_ratio
+
+# Bump whenever a change here alters rendered output, so cached renders
+# made by older code are not served
+ENGINE_VERSION = 3
+
+CROSSFADE_BEATS = 4
+TRANSITION_START_BEAT = 8
+MIN_TIME_BEFORE_TRANSITION = 8
+VOCALS_CROSSOVER_MIN_TIME = 45
+VOCALS_CROSSFADE_MS = 3000
+TEASE_DURATION_MS = 10000
+SCRATCH_LOOPS = {
+    'scratch': ('transitions/scratch_loop.wav', 600),
+    'crazy_scratch': ('transitions/crazy_scratch_loop.wav', 750),
+}
+
+def plan_transition(beats_current, beats_transition, transition_type, stretch_ratio=1.0, min_time=MIN_TIME_BEFORE_TRANSITION):
+    # Cue points (ms into each chorus) for a transition, from the beat grids.
+    # min_time is the earliest a crossfade/scratch may start (seconds).
+    if transition_type == "vocals_crossover":
+        start_beat_idx = next((i for i, t in enumerate(beats_current) if t >= VOCALS_CROSSOVER_MIN_TIME), 0)
+        return {
+            'vocals_current_down': int(beats_current[start_beat_idx] * 1000),
+            'vocals_transition_in': int(beats_transition[TRANSITION_START_BEAT] * 1000),
+            'stretch_ratio': stretch_ratio,
+        }
+
+    # Find the beat index closest to min_time
+    start_beat_idx = next((i for i, t in enumerate(beats_current) if t >= min_time), 0)
+    return {
+        'vocals_current_down': int(beats_current[start_beat_idx] * 1000),
+        'vocals_transition_in': int(beats_current[start_beat_idx + CROSSFADE_BEATS] * 1000),
+        'transition_start_time': int(beats_transition[TRANSITION_START_BEAT] * 1000),
+        'stretch_ratio': stretch_ratio,
+    }
+
+def stem_windows(plan, transition_type):
+    # Ranges (ms) where each song's individual stems are actually used. Outside
+    # them the mix only ever needs vocals + instrumental together, so the
+    # original audio can be used unseparated.
+    if transition_type == "crossfade":
+        crossfade_duration = plan['vocals_transition_in'] - plan['vocals_current_down']
+        return (
+            [(plan['vocals_current_down'], plan['vocals_transition_in'])],
+            [(plan['transition_start_time'], plan['transition_start_time'] + 2 * crossfade_duration)]
+        )
+    if transition_type == "vocals_crossover":
+        ratio = plan['stretch_ratio']
+        down = plan['vocals_current_down']
+        vocals_in = plan['vocals_transition_in']
+        # Song B's stretched vocals span the scaled range; its instrumental
+        # fades in over an unscaled crossfade from (vocals_in + tease) * ratio
+        transition_end = max(
+            (vocals_in + TEASE_DURATION_MS + VOCALS_CROSSFADE_MS) * ratio,
+            (vocals_in + TEASE_DURATION_MS) * ratio + VOCALS_CROSSFADE_MS
+        )
+        return (
+            [(down - VOCALS_CROSSFADE_MS, down + TEASE_DURATION_MS + VOCALS_CROSSFADE_MS)],
+            [((vocals_in - VOCALS_CROSSFADE_MS) * ratio, transition_end)]
+        )
+    # Scratch transitions just butt the two full mixes together
+    return [], []
+
+def stream_prefix_ms(plan, transition_type):
+    # Length of the opening of the current chorus that plays unchanged. It
+    # lies before every stem window, so it can be encoded and streamed
+    # before separation even starts.
+    if transition_type == "vocals_crossover":
+        return max(0, plan['vocals_current_down'] - VOCALS_CROSSFADE_MS)
+    return plan['vocals_current_down']
+
+def create_transition(songs_dir, transition_type="crossfade", stems_current=None, stems_transition=None, rate_current=None, rate_transition=None, beats_current=None, beats_transition=None, stretch_ratio=None, writer=None, streamed_ms=0):
+    # Stems come straight from split_audio at the given rates; fall back to
+    # WAVs on disk. Everything is mixed as float32 on one Mixer timeline at the
+    # current song's rate and quantized once at the end. With a
+    # StreamingMp3Writer the result is encoded into it, skipping the first
+    # streamed_ms already written, instead of exporting dj_transition.mp3.
+    if stems_current is None:
+        stems_current, rate_current = load_stems(songs_dir + "/current_song")
+    if stems_transition is None:
+        stems_transition, rate_transition = load_stems(songs_dir + "/transition_song")
+
+    channels = writer.channels if writer is not None else stems_current['vocals'].shape[1]
+    mix = Mixer(rate_current, channels)
+    rate = mix.rate
+
+    vocals_current = mix.prepare(stems_current['vocals'], rate_current)
+    bass_current   = mix.prepare(stems_current['bass'], rate_current)
+    drums_current  = mix.prepare(stems_current['drums'], rate_current)
+    other_current  = mix.prepare(stems_current['other'], rate_current)
+
+    vocals_transition = mix.prepare(stems_transition['vocals'], rate_transition)
+    bass_transition   = mix.prepare(stems_transition['bass'], rate_transition)
+    drums_transition  = mix.prepare(stems_transition['drums'], rate_transition)
+    other_transition  = mix.prepare(stems_transition['other'], rate_transition)
 
     # Build instrumentals
     instrumental_current = build_instrumental(bass_current, drums_current, other_current)
     instrumental_transition = build_instrumental(bass_transition, drums_transition, other_transition)
-    instrumental_current.export(songs_dir + "/current_song/instrumentals.wav", format="wav")
-    instrumental_transition.export(songs_dir + "/transition_song/instrumentals.wav", format="wav")
 
     # Combine vocals with instrumentals
-    song_current = instrumental_current.overlay(vocals_current)
-    song_transition = instrumental_transition.overlay(vocals_transition)
-
-    song_current_path = os.path.join(songs_dir, "current_song", "full_mix.wav")
-    song_transition_path = os.path.join(songs_dir, "transition_song", "full_mix.wav")
-
-    song_current.export(song_current_path, format="wav")
-    song_transition.export(song_transition_path, format="wav")
-
-    beats_current = get_beat_times_essentia(song_current_path)
-    beats_transition = get_beat_times_essentia(song_transition_path)
-    crossfade_beats = 4
+    song_current = instrumental_current + vocals_current
+    song_transition = instrumental_transition + vocals_transition
 
-    # Desired minimum time before transition in seconds
-    min_time_before_transition = 8
+    if DEBUG_AUDIO:
+        sf.write(songs_dir + "/current_song/instrumentals.wav", instrumental_current, rate)
+        sf.write(songs_dir + "/transition_song/instrumentals.wav", instrumental_transition, rate)
+        sf.write(os.path.join(songs_dir, "current_song", "full_mix.wav"), song_current, rate)
+        sf.write(os.path.join(songs_dir, "transition_song", "full_mix.wav"), song_transition, rate)
 
-    # Find the beat index closest to min_time_before_transition
-    start_beat_idx = next((i for i, t in enumerate(beats_current) if t >= min_time_before_transition), 0)
+    if beats_current is None:
+        beats_current = get_beat_times_essentia(array_to_mono(song_current, rate))
+    if beats_transition is None:
+        beats_transition = get_beat_times_essentia(array_to_mono(song_transition, rate))
 
-    fade_start_time_current = beats_current[start_beat_idx]
-    fade_end_time_current = beats_current[start_beat_idx + crossfade_beats]
-    fade_start_time_transition = beats_transition[8]  # you can also randomize or select more meaningfully
+    # vocals_crossover uses its own cue points, planned in its branch below
+    plan = plan_transition(beats_current, beats_transition, "crossfade" if transition_type == "vocals_crossover" else transition_type)
+    vocals_current_down = plan['vocals_current_down']
+    vocals_transition_in = plan['vocals_transition_in']
+    transition_start_time = plan['transition_start_time']
 
-    # Convert to milliseconds
-    vocals_current_down = int(fade_start_time_current * 1000)
-    vocals_transition_in = int(fade_end_time_current * 1000)
-    transition_start_time = int(fade_start_time_transition * 1000)
-    transition_start_other = vocals_current_down
-
-    # Convert to milliseconds
-    vocals_current_down = int(fade_start_time_current * 1000)
-    vocals_transition_in = int(fade_end_time_current * 1000)
-    transition_start_time = int(fade_start_time_transition * 1000)
-    transition_start_other = vocals_current_down
+    # Cue points below are sample offsets on the mix timeline
+    samples = mix.samples
 
     if transition_type == "crossfade":
-        crossfade_duration = vocals_transition_in - vocals_current_down
+        down = samples(vocals_current_down)
+        crossfade = samples(vocals_transition_in - vocals_current_down)
+        transition_start = samples(transition_start_time)
 
         # Part 1: Intro from current song
-        full_current = song_current[:vocals_current_down]
+        mix.add(song_current, 0, 0, down)
 
-        # Part 2: Crossfade section
-        current_fade_out = instrumental_current[vocals_current_down:vocals_transition_in].fade_out(crossfade_duration)
-        current_fade_out = current_fade_out.overlay(vocals_current[vocals_current_down:vocals_transition_in].fade_out(int(crossfade_duration * 0.6)))
-        current_fade_out = current_fade_out.overlay(instrumental_transition[transition_start_time:transition_start_time+crossfade_duration].fade_in(crossfade_duration))
+        # Part 2: Crossfade section, current vocals only fading over the last 60%
+        mix.add(instrumental_current, down, down, down + crossfade, fade_out=crossfade)
+        mix.add(vocals_current, down, down, down + crossfade, fade_out=int(crossfade * 0.6))
 
-        # Part 3: Bring in vocals from transition
-        transition_vocals_fade_in = vocals_transition[transition_start_time+crossfade_duration:transition_start_time+2*crossfade_duration].fade_in(crossfade_duration)
-        transition_vocals_fade_in = transition_vocals_fade_in.overlay(instrumental_transition[transition_start_time+crossfade_duration:])
+        # Transition instrumental fades in and plays on to the end
+        mix.add(instrumental_transition, down, transition_start, fade_in=crossfade)
 
-        # Part 4: Remainder of transition
-        transition_remainder = vocals_transition[transition_start_time+2*crossfade_duration:].overlay(instrumental_transition[transition_start_time+2*crossfade_duration:])
+        # Part 3: Bring in vocals from transition, which then play on to the end
+        mix.add(vocals_transition, down + crossfade, transition_start + crossfade, fade_in=crossfade)
 
-        # Final song
-        final_transition = full_current + current_fade_out + transition_vocals_fade_in + transition_remainder
-        output_file = songs_dir + "/dj_transition.mp3"
+    elif transition_type in SCRATCH_LOOPS:
+        loop_path, loop_ms = SCRATCH_LOOPS[transition_type]
 
-    elif transition_type == "scratch":
-        scratch_start = transition_start_other
-        full_current = song_current[:scratch_start]
+        # Full song A up to the cue, the scratch loop, then the full transition
+        mix.add(song_current, 0, 0, samples(vocals_current_down))
+        loop, loop_rate = load_array(loop_path)
+        mix.append(mix.prepare(loop.T, loop_rate), end=samples(loop_ms))
+        mix.append(song_transition)
 
-        scratch_loop = AudioSegment.from_file('transitions' + "/scratch_loop.wav")[:600]
+    elif transition_type == "vocals_crossover":
 
-        final_transition = full_current + scratch_loop + song_transition
-        output_file = songs_dir + "/dj_transition.mp3"
+        if stretch_ratio is None:
+            stretch_ratio = get_stretch_ratio(songs_dir)
 
-    elif transition_type == "crazy_scratch":
-        scratch_start = transition_start_other
+        plan = plan_transition(beats_current, beats_transition, transition_type, stretch_ratio)
+        vocals_current_down = plan['vocals_current_down']
+        vocals_transition_in = plan['vocals_transition_in']
 
-        # Full song A
-        full_current = song_current[:scratch_start]
+        vocals_b_matched, ratio1 = match_bpm(songs_dir, vocals_transition, rate, stretch_ratio)
 
-        # Scratching
-        scratch_loop = AudioSegment.from_file('transitions' + "/crazy_scratch_loop.wav")[:750]
+        down, vocals_in = samples(vocals_current_down), samples(vocals_transition_in)
+        crossfade, tease = samples(VOCALS_CROSSFADE_MS), samples(TEASE_DURATION_MS)
+        # Where song B picks up after the tease, on its own (unstretched) timeline
+        resume = samples(int((vocals_transition_in + TEASE_DURATION_MS) * ratio1))
 
-        # Full transition
-        final_transition = full_current + scratch_loop + song_transition
-        output_file = songs_dir + "/dj_transition.mp3"
-    
-    elif transition_type == "vocals_crossover":
+        # PART 1 - 2.5: Song A instrumental until the instrumental switch
+        mix.add(instrumental_current, 0, 0, down + tease + crossfade, fade_out=crossfade)
+
+        # PART 1 - 1.5: Song A vocals, switching to song B's tempo-matched vocals
+        mix.add(vocals_current, 0, 0, down, fade_out=crossfade)
+        mix.add(vocals_b_matched, down - crossfade, vocals_in - crossfade, vocals_in + tease + crossfade, fade_in=crossfade)
+
+        # PART 2.5 - 3: Song B instrumental comes in, then song B continues
+        mix.add(instrumental_transition, down + tease, resume, fade_in=crossfade)
+        mix.add(vocals_transition, down + tease + crossfade, resume + crossfade)
 
-        # Desired minimum time before transition in seconds
-        min_time_before_transition = 45
-
-        # Song A transition out timing
-        start_beat_idx = next((i for i, t in enumerate(beats_current) if t >= min_time_before_transition), 0)
-        fade_start_time_current = beats_current[start_beat_idx]
-        fade_end_time_current = beats_current[start_beat_idx + crossfade_beats]
-
-        # Song B transition in timing (matching the crossfade duration)
-        transition_start_beat_idx = 8  # or choose dynamically
-        fade_start_time_transition = beats_transition[transition_start_beat_idx]
-        fade_end_time_transition = beats_transition[transition_start_beat_idx + crossfade_beats]
-
-        # Convert to milliseconds
-        vocals_current_down = int(fade_start_time_current * 1000)
-        vocals_transition_in = int(fade_start_time_transition * 1000)  # CORRECTED
-        transition_start_time = int(fade_start_time_transition * 1000)  # entry point of Song B audio
-        transition_end_time_b = int(fade_end_time_transition * 1000)    # when B has fully entered
-        transition_start_other = vocals_current_down
-        
-        matched_vocals_path, ratio1 = match_bpm(songs_dir, songs_dir + "/transition_song/vocals.wav")
-        tease_duration_ms = 10000
-
-        vocals_b_matched = AudioSegment.from_file(matched_vocals_path)
-        crossfade_duration = 3000
-
-        # PART 1: Song A
-        part1 = vocals_current[:vocals_current_down-crossfade_duration]
-        part1 = part1.overlay(instrumental_current[:vocals_current_down-crossfade_duration])
-
-        # PART 1.5: Vocals Switch
-        part1_5 = vocals_current[vocals_current_down-crossfade_duration:vocals_current_down].fade_out(crossfade_duration)
-        part1_5 = part1_5.overlay(instrumental_current[vocals_current_down-crossfade_duration:vocals_current_down])
-        part1_5 = part1_5.overlay(vocals_b_matched[vocals_transition_in-crossfade_duration:vocals_transition_in].fade_in(crossfade_duration))
-        
-        # PART 2: Song A instrumental + Song B vocals
-        a_instr_tease = instrumental_current[vocals_current_down:vocals_current_down + tease_duration_ms]
-        b_vocals_tease = vocals_b_matched[vocals_transition_in:vocals_transition_in + tease_duration_ms]
-        part2 = a_instr_tease.overlay(b_vocals_tease)
-
-        # PART 2.5: Instrumental Switch
-        a_instr_tease = instrumental_current[vocals_current_down + tease_duration_ms:vocals_current_down + tease_duration_ms + crossfade_duration].fade_out(crossfade_duration)
-        b_vocals_tease = vocals_b_matched[vocals_transition_in + tease_duration_ms:vocals_transition_in + tease_duration_ms + crossfade_duration]
-        part2_5 = a_instr_tease.overlay(b_vocals_tease)
-        part2_5 = part2_5.overlay(instrumental_transition[int((vocals_transition_in+tease_duration_ms) * ratio1):int((vocals_transition_in+tease_duration_ms+crossfade_duration) * ratio1)].fade_in(crossfade_duration))
-
-        # PART 3: Song B continued
-        part3 = vocals_transition[int((vocals_transition_in+tease_duration_ms + crossfade_duration) * ratio1):]
-        part3 = part3.overlay(instrumental_transition[int((vocals_transition_in+tease_duration_ms+ crossfade_duration) * ratio1):])
-
-        final_transition = part1 + part1_5 + part2 + part2_5 + part3
-        output_file = songs_dir + "/dj_transition.mp3"
-    
     else:
         raise ValueError(f"Unsupported transition type: {transition_type}")
 
-    final_transition.export(output_file, format="mp3")
-    print(f"{transition_type.title()} DJ Transition created!")
\ No newline at end of file
+    with timed('mp3_export'):
+        pcm = mix.render()
+        if writer is not None:
+            writer.write(pcm[ms_to_samples(streamed_ms, rate):])
+        else:
+            pcm_to_segment(pcm, rate).export(songs_dir + "/dj_transition.mp3", format="mp3")
+    inc('audio_seconds', len(pcm) / rate, 'Seconds of audio processed', stage='render')
+    print(f"{transition_type.title()} DJ Transition created!")
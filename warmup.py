@@ -0,0 +1,58 @@
+import threading
+import time
+
+class Warmup:
+    # Runs the slow part of startup (importing torch/demucs/essentia, creating
+    # the Supabase client, loading models and the catalog) on a background
+    # thread, so the server accepts connections and answers liveness checks
+    # straight away. Each step is timed; ready() flips once all have run.
+
+    def __init__(self):
+        self.status = 'pending'
+        self.error = None
+        self.steps = {}
+        self.started_at = None
+        self.finished_at = None
+        self._ready = threading.Event()
+        self._thread = None
+
+    def start(self, steps):
+        # steps: ordered (name, fn) pairs
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, args=(steps,), daemon=True)
+            self._thread.start()
+
+    def _run(self, steps):
+        self.status = 'warming'
+        self.started_at = time.perf_counter()
+        for name, fn in steps:
+            step_start = time.perf_counter()
+            try:
+                fn()
+            except Exception as e:
+                self.status = 'failed'
+                self.error = f"{name}: {e}"
+                self.finished_at = time.perf_counter()
+                print(f"Warmup step {name} failed: {e}")
+                return
+            self.steps[name] = round(time.perf_counter() - step_start, 3)
+            print(f"Warmup: {name} took {self.steps[name]:.2f}s")
+        self.finished_at = time.perf_counter()
+        self.status = 'ready'
+        self._ready.set()
+
+    def ready(self):
+        return self._ready.is_set()
+
+    def wait(self, timeout=None):
+        return self._ready.wait(timeout)
+
+    def report(self):
+        return {
+            'status': self.status,
+            'error': self.error,
+            'steps': dict(self.steps),
+            'warmup_seconds': round(self.finished_at - self.started_at, 3) if self.finished_at else None,
+        }
+
+warmup = Warmup()